@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+# analyze.py -- Run several post analyzers in a single pass over posts
+#
+# chktopic.py and chklinks.py each go through every post on their own.
+# This driver brings the shared metadata store up to date, so each post
+# is parsed at most once, then hands the same record of every post to
+# each analyzer.  Every analyzer writes its own report.
+#
+# Usage:
+#       ./analyze.py                      Run all analyzers
+#       ./analyze.py topic links          Run just these analyzers
+#       ./analyze.py --workers 4          Extract new posts in 4 processes
+#
+# Analyzers:
+#       topic       reclassify.txt     topic group each post belongs in
+#       links       broken_links.txt   links that need to be fixed
+#                   moved_links.txt    links that redirect, and where to
+#       author      authors.txt        posts not written by our blogger
+#       permalink   permalinks.txt     posts whose file name and permalink
+#                                      do not agree
+#
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import chklinks
+import chktopic
+from constants import POSTSDIR
+from docArchive import list_docs
+from functions import get_modname, get_option, setup_logging
+from linkCache import LinkCache
+from linkChecker import LinkChecker
+from postStore import PostStore
+from showProgress import showProgress
+
+BLOGID = re.compile(r'Tony[ ]?Pearson')
+PERMregex = re.compile(r'/(20\d\d)/(\d\d)/(\d\d)/([^/?#]*)')
+
+
+class Analyzer():
+    """
+    Base class for analyzers run by analyze.py
+
+    post() is called with the record of every post, in sorted file name
+    order, then end() is called once to write the report.
+    """
+
+    report = ''
+
+    def __init__(self, logger, store):
+        self.logger = logger
+        self.store = store
+
+    def post(self, postname, record):
+        return None
+
+    def end(self):
+        return None
+
+
+class TopicAnalyzer(Analyzer):
+    """ Topic scoring, same as chktopic.py """
+
+    report = chktopic.RESULTFILE
+
+    def __init__(self, logger, store):
+        super().__init__(logger, store)
+        chktopic.logger = logger
+        self.cache = chktopic.open_cache()
+        self.postnames = []
+        self.results = {}
+
+    def post(self, postname, record):
+        if not os.path.basename(postname).startswith('20'):
+            return None
+        key = chktopic.cache_key(self.store, postname)
+        result = self.cache.get(key)
+        if result is None:
+            result = chktopic.parse(postname, record)
+            self.cache.put(key, result)
+        self.postnames.append(postname)
+        self.results[postname] = result
+        return None
+
+    def end(self):
+        chktopic.write_results(self.postnames, self.results)
+        self.cache.close()
+        return None
+
+
+class LinkAnalyzer(Analyzer):
+    """ Link checking, same as chklinks.py """
+
+    report = 'broken_links.txt'
+
+    def __init__(self, logger, store):
+        super().__init__(logger, store)
+        self.records = []
+
+    def post(self, postname, record):
+        self.records.append((postname, record))
+        return None
+
+    def end(self):
+        urls = []
+        for postname, record in self.records:
+            urls.extend(chklinks.links_to_check(record))
+        cache = LinkCache()
+        checker = LinkChecker()
+        codes = checker.check_all(urls, cache)
+        checker.close()
+        cache.close()
+
+        with open(self.report, 'w') as out_file:
+            for postname, record in self.records:
+                problems = chklinks.parse(postname, record, codes,
+                                          checker.short_circuited)
+                chklinks.report(postname, problems, out_file)
+        with open(chklinks.MOVEDFILE, 'w') as moved_file:
+            for postname, record in self.records:
+                chklinks.report(postname,
+                                chklinks.moved(record, checker.redirects),
+                                moved_file, 'moved links')
+        return None
+
+
+class AuthorAnalyzer(Analyzer):
+    """ Posts that do not belong to our blogger """
+
+    report = 'authors.txt'
+
+    def __init__(self, logger, store):
+        super().__init__(logger, store)
+        self.out_file = open(self.report, 'w')
+
+    def post(self, postname, record):
+        if not BLOGID.search(record.postedby):
+            print(postname, record.postedby or '-- no author found',
+                  file=self.out_file)
+        return None
+
+    def end(self):
+        self.out_file.close()
+        return None
+
+
+class PermalinkAnalyzer(Analyzer):
+    """ Posts whose permalink is missing or does not match the file """
+
+    report = 'permalinks.txt'
+
+    def __init__(self, logger, store):
+        super().__init__(logger, store)
+        self.out_file = open(self.report, 'w')
+
+    def post(self, postname, record):
+        mo = PERMregex.search(record.permalink)
+        if mo is None:
+            print('MISSING', postname, record.permalink, file=self.out_file)
+            return None
+        date_part = '-'.join(mo.group(1, 2, 3))
+        filename = os.path.basename(postname)
+        if (not filename.startswith(date_part)
+                or not filename.endswith('-' + mo.group(4) + '.html')):
+            print('MISMATCH', postname, record.permalink, file=self.out_file)
+        return None
+
+    def end(self):
+        self.out_file.close()
+        return None
+
+
+ANALYZERS = {'topic': TopicAnalyzer,
+             'links': LinkAnalyzer,
+             'author': AuthorAnalyzer,
+             'permalink': PermalinkAnalyzer,
+             }
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    workers = max(get_option(argv, '--workers', 1), 1)
+    names = []
+    args = argv[1:]
+    for pos, arg in enumerate(args):
+        if arg.startswith('--') or (pos and args[pos - 1] == '--workers'):
+            continue
+        if arg not in ANALYZERS:
+            print('   Error, unknown analyzer "' + arg + '"')
+            print('   Analyzers are: ', ', '.join(ANALYZERS))
+            sys.exit()
+        names.append(arg)
+    return modname, workers, names or list(ANALYZERS)
+
+
+if __name__ == "__main__":
+    modname, workers, names = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+
+    # Only process HTML files in this directory
+    postnames = list_docs(POSTSDIR)
+
+    # The one place posts get parsed, and only if new or changed
+    store = PostStore()
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            extracted = store.update(postnames, pool.map)
+    else:
+        extracted = store.update(postnames)
+    logger.info('Posts: {} Extracted: {}'.format(len(postnames), extracted))
+
+    analyzers = [ANALYZERS[name](logger, store) for name in names]
+    dot = showProgress()
+    for postname in postnames:
+        dot.show()
+        record = store.get(postname)
+        for analyzer in analyzers:
+            analyzer.post(postname, record)
+    dot.end()
+
+    for analyzer in analyzers:
+        logger.info('Writing {}'.format(analyzer.report))
+        analyzer.end()
+        print('Report:', analyzer.report)
+    store.close()
+
+    print('Done.')
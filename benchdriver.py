@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# benchdriver.py -- Measure browser page loads, as set up before and now
+#
+# Loads the same frames and posts in a browser set up the way the scripts
+# used to, a default webdriver.Chrome() taking screenshots, and in
+# browsers from pageClass.make_driver with its options turned on one at
+# a time: headless, then eager page loads, then blocking of images, media
+# and third-party hosts.  Reports seconds to sign in, and p50 and mean
+# seconds per frame and per post, for each.
+#
+# Posts are taken from postlist.txt, written by scanframes.py.  This goes
+# to the live community site, with one login for each setup.
+#
+# Usage:
+#       ./benchdriver.py                 Frames of fla, 5 frames, 5 posts
+#       ./benchdriver.py tap             Frames of the tap topic group
+#       ./benchdriver.py --frames 10     Load 10 frames with each setup
+#       ./benchdriver.py --posts 10      Load 10 posts with each setup
+#       ./benchdriver.py --login         Full sign-in for every setup,
+#                                        not the saved login
+#
+import statistics
+import sys
+import time
+from selenium import webdriver
+from functions import get_modname, get_option, percentile, setup_logging
+from pageClass import COMKEYS, FramePage, HomePage, PostPage, make_driver
+
+TOPIC = 'fla'
+FRAMES = 5
+POSTS = 5
+POSTLIST = 'postlist.txt'
+HEADING = '{:>10} {:>8} {:>7} {:>10} {:>10} {:>7} {:>10} {:>10}'
+ROW = '{:>10} {:>8.2f} {:>7} {:>10} {:>10} {:>7} {:>10} {:>10}'
+
+# name, make_driver options; None is the setup the scripts used to have
+SETUPS = [
+    ('default', None),
+    ('headless', {'headless': True, 'eager': False,
+                  'block_images': False, 'block_hosts': False}),
+    ('+eager', {'headless': True, 'eager': True,
+                'block_images': False, 'block_hosts': False}),
+    ('+blocking', {'headless': True, 'eager': True,
+                   'block_images': True, 'block_hosts': True}),
+    ]
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    args = [arg for pos, arg in enumerate(argv[1:])
+            if not arg.startswith('--')
+            and argv[pos] not in ('--frames', '--posts')]
+    topic = args[0] if args else TOPIC
+    if topic not in COMKEYS:
+        print('   Error, invalid topic group "' + topic + '"')
+        print('   Parameter must be one of: ', ', '.join(COMKEYS))
+        sys.exit()
+    parms = {'topic': topic,
+             'frames': max(get_option(argv, '--frames', FRAMES), 1),
+             'posts': max(get_option(argv, '--posts', POSTS), 0),
+             'fresh': '--login' in argv,
+             }
+    return modname, parms
+
+
+def post_links(count, filename=POSTLIST):
+    """ The first count distinct post links in postlist.txt """
+    links = []
+    try:
+        with open(filename, 'r') as in_file:
+            for line in in_file:
+                fields = line.split()
+                if len(fields) > 1 and fields[1] not in links:
+                    links.append(fields[1])
+                if len(links) >= count:
+                    break
+    except FileNotFoundError:
+        print('   No', filename, 'to take posts from, run scanframes.py')
+    return links
+
+
+def timed(step):
+    """ (seconds, result) of calling step """
+    start = time.perf_counter()
+    result = step()
+    return time.perf_counter() - start, result
+
+
+def run_setup(options, topic, frames, links, fresh):
+    """ Seconds to sign in, and for each frame and each post loaded """
+    if options is None:
+        browser = webdriver.Chrome()
+        browser.screenshots = True
+    else:
+        browser = make_driver(**options)
+    try:
+        login = timed(lambda: HomePage(browser, logger).login(fresh))[0]
+        frame = FramePage(browser, logger)
+        frame_times = [timed(lambda: frame.load_from_key(topic))[0]]
+        while len(frame_times) < frames:
+            seconds, more_pages = timed(frame.next_page)
+            if not more_pages:
+                break
+            frame_times.append(seconds)
+        post = PostPage(browser, logger)
+        post_times = [timed(lambda: post.from_permalink(link))[0]
+                      for link in links]
+    finally:
+        browser.quit()
+    return login, frame_times, post_times
+
+
+def summary(times):
+    """ p50 and mean of times, in seconds """
+    if not times:
+        return '-', '-'
+    return ('{:.2f}'.format(percentile(times, 50)),
+            '{:.2f}'.format(statistics.mean(times)))
+
+
+if __name__ == "__main__":
+    modname, parms = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+    links = post_links(parms['posts'])
+    logger.info('Topic: {} Frames: {} Posts: {}'.format(
+        parms['topic'], parms['frames'], len(links)))
+
+    print(HEADING.format(
+        'Setup', 'Login s', 'Frames', 'p50 s', 'Mean s',
+        'Posts', 'p50 s', 'Mean s'))
+    for name, options in SETUPS:
+        login, frame_times, post_times = run_setup(
+            options, parms['topic'], parms['frames'], links, parms['fresh'])
+        line = ROW.format(
+            name, login, len(frame_times), *summary(frame_times),
+            len(post_times), *summary(post_times))
+        print(line)
+        logger.info(line)
+
+    print("Done.")
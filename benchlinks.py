@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+# benchlinks.py -- Measure link checking against local stand-in hosts
+#
+# Takes the links listed in broken_links.txt, keeps the shape of them
+# (how many links, how many per host, the paths and repeats), and points
+# them at stand-in hosts on this machine.  Runs the link checker over
+# them and reports links per second, p50 and p99 latency of the requests
+# and peak memory of the checker.  Nothing is sent over the internet.
+#
+# Usage:
+#       ./benchlinks.py                  Links shaped like broken_links.txt
+#       ./benchlinks.py --links 5000     Repeat the shapes up to 5000 links
+#       ./benchlinks.py --hosts 20       Spread them over 20 stand-in hosts
+#       ./benchlinks.py --latency 50     Answer after 50 milliseconds
+#       ./benchlinks.py --errors 10      10% of links are 404 or 500
+#       ./benchlinks.py --redirects 10   10% of links are moved once
+#       ./benchlinks.py --hanging 10     10% of hosts never answer in time
+#       ./benchlinks.py --dead 10        10% of hosts refuse connections
+#       ./benchlinks.py --limit 64       Checker settings, as chklinks.py
+#       ./benchlinks.py --per-host 2
+#       ./benchlinks.py --timeout 2
+#
+import collections
+import sys
+import time
+import tracemalloc
+import zlib
+from urllib.parse import urlsplit, urlunsplit
+from functions import get_modname, get_option, number, percentile
+from functions import setup_logging
+from linkChecker import LinkChecker, GLOBAL_LIMIT, HOST_LIMIT, TIMEOUT
+from standIn import StandIn
+
+REPORT = 'broken_links.txt'
+HOSTS = 20
+LATENCY = 50        # milliseconds
+KINDS = ['gone', 'error']
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    parms = {'links': get_option(argv, '--links', 0),
+             'hosts': max(get_option(argv, '--hosts', HOSTS), 1),
+             'latency': get_option(argv, '--latency', LATENCY, number),
+             'errors': get_option(argv, '--errors', 0, number),
+             'redirects': get_option(argv, '--redirects', 0, number),
+             'hanging': get_option(argv, '--hanging', 0, number),
+             'dead': get_option(argv, '--dead', 0, number),
+             'limit': max(get_option(argv, '--limit', GLOBAL_LIMIT), 1),
+             'host_limit': max(get_option(argv, '--per-host', HOST_LIMIT), 1),
+             'timeout': get_option(argv, '--timeout', TIMEOUT, number),
+             }
+    return modname, parms
+
+
+def link_shapes(filename=REPORT):
+    """ (host, path) of every link listed in a chklinks.py report """
+    shapes = []
+    try:
+        with open(filename, 'r') as in_file:
+            for line in in_file:
+                fields = line.split()
+                if line.startswith('    ') and len(fields) > 1:
+                    parts = urlsplit(fields[1])
+                    path = urlunsplit(('', '', parts.path or '/',
+                                       parts.query, ''))
+                    shapes.append((parts.netloc.lower(), path))
+    except FileNotFoundError:
+        pass
+    if not shapes:      # made up, a few links to each of 50 hosts
+        shapes = [('host{}'.format(n % 50), '/page{}'.format(n))
+                  for n in range(500)]
+    return shapes
+
+
+def choose(key, errors, redirects):
+    """ ok, gone, error or moved, the same every time for this key """
+    pick = zlib.crc32(key.encode()) % 10000 / 100    # 0 to 99.99
+    if pick < errors:
+        return KINDS[int(pick) % len(KINDS)]
+    if pick < errors + redirects:
+        return 'moved'
+    return 'ok'
+
+
+def make_urls(shapes, hosts, count, errors, redirects):
+    """
+    count urls shaped like these, on these stand-in hosts
+
+    Each real host always maps to the same stand-in host, under its own
+    name, and a link that repeats in the shapes repeats in the urls.
+    Past the end of the shapes they are used again with ?n= added, so
+    they are new links.
+    """
+    urls = []
+    for index in range(count or len(shapes)):
+        host, path = shapes[index % len(shapes)]
+        rounds = index // len(shapes)
+        if rounds:
+            path += '{}n={}'.format('&' if '?' in path else '?', rounds)
+        base = hosts[zlib.crc32(host.encode()) % len(hosts)]
+        kind = choose(host + path, errors, redirects)
+        urls.append(base + kind + '/' + host + path)
+    return urls
+
+
+class TimedChecker(LinkChecker):
+    """ LinkChecker that records how long each link took """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def fetch(self, url):
+        start = time.perf_counter()
+        result = super().fetch(url)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+
+if __name__ == "__main__":
+    modname, parms = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+
+    hosts = parms['hosts']
+    stand_in = StandIn(hosts,
+                       hanging=round(hosts * parms['hanging'] / 100),
+                       dead=round(hosts * parms['dead'] / 100),
+                       latency=parms['latency'] / 1000)
+    urls = make_urls(link_shapes(), stand_in.hosts, parms['links'],
+                     parms['errors'], parms['redirects'])
+    logger.info('Links: {} Hosts: {} Hanging: {} Dead: {}'.format(
+        len(urls), hosts, len(stand_in.hanging), len(stand_in.dead)))
+
+    checker = TimedChecker(parms['limit'], parms['host_limit'],
+                           parms['timeout'])
+    tracemalloc.start()
+    start = time.perf_counter()
+    codes = checker.check_all(urls)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    checker.close()
+    stand_in.close()
+
+    results = [
+        ('Links', len(urls)),
+        ('Checked', checker.checked),
+        ('Short-circuited', len(checker.short_circuited)),
+        ('Redirected', len(checker.redirects)),
+        ('Seconds', '{:.2f}'.format(elapsed)),
+        ('Links/sec', '{:.1f}'.format(len(urls) / elapsed)),
+        ('p50 ms', '{:.1f}'.format(percentile(checker.latencies, 50) * 1000)),
+        ('p99 ms', '{:.1f}'.format(percentile(checker.latencies, 99) * 1000)),
+        ('Peak MB', '{:.2f}'.format(peak / 2**20)),
+        ]
+    for name, value in results:
+        print('{:>16}: {}'.format(name, value))
+        logger.info('{}: {}'.format(name, value))
+    tally = collections.Counter(codes.values())
+    print('{:>16}: {}'.format('Codes', dict(sorted(tally.items()))))
+
+    print("Done.")
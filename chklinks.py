@@ -2,13 +2,27 @@
 # chklinks.py -- Check links in all posts
 # By Tony Pearson, IBM, 2020
 #
+# Usage:
+#       ./chklinks.py                 Check links, 32 at a time
+#       ./chklinks.py --limit 64      Allow 64 requests in flight at once
+#       ./chklinks.py --per-host 2    But no more than 2 to any one host
+#       ./chklinks.py --ttl 1         Recheck links not checked in a day
+#       ./chklinks.py --nocache       Recheck every link
+#
+# Links that redirect are listed with their redirect chain in
+# moved_links.txt, so they can be updated to where they now point.
+#
 import os
 import re
 import requests
 import sys
-from bs4 import BeautifulSoup
-from pageClass import POSTSDIR, PARSER
-from functions import get_modname, setup_logging
+from docArchive import list_docs, read_doc
+from linkCache import LinkCache, TTL
+from linkChecker import LinkChecker, GLOBAL_LIMIT, HOST_LIMIT
+from pageClass import POSTSDIR
+from postExtract import extract
+from postStore import PostStore
+from functions import get_modname, get_option, number, setup_logging
 
 BLOGID = re.compile(r'Tony[ ]?Pearson')
 STEMS = ['#',
@@ -28,15 +42,47 @@ STEMS = ['#',
          ]
 DWORKS = 'https://www.ibm.com/developerworks/community/blogs/'
 OLDBLOG = DWORKS + 'InsideSystemStorage/'
+SHORTED = ' (short-circuited, host down)'
+MOVEDFILE = 'moved_links.txt'
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    limit = max(get_option(argv, '--limit', GLOBAL_LIMIT), 1)
+    host_limit = max(get_option(argv, '--per-host', HOST_LIMIT), 1)
+    parms = {'limit': limit,
+             'host_limit': host_limit,
+             'ttl': get_option(argv, '--ttl', TTL / 86400, number) * 86400,
+             'use_cache': '--nocache' not in argv,
+             }
+    return modname, parms
 
 
-def parse(postname):
-    """ Parse the post to extract all links """
-    soup = BeautifulSoup(open(postname), PARSER)
+def links_to_check(record):
+    """ links in the post that need a request to find their status """
+    return [extlink for extlink in record.links
+            if not extlink.startswith(DWORKS) and allowlist(extlink)]
+
+
+def parse(postname, record=None, codes=None, shorted=()):
+    """
+    Parse the post to extract all links, return the problems found
+
+    codes is a dictionary of link to status code, from checking the
+    links of many posts at once.  Without it, this post's links are
+    checked here.  Links in shorted were not requested because their
+    host was already known to be down, and are marked as such.
+    """
+    if record is None:
+        record = extract(read_doc(postname))
+    if codes is None:
+        checker = LinkChecker()
+        codes = checker.check_all(links_to_check(record))
+        shorted = checker.short_circuited
+        checker.close()
     problems = []
-    links = soup.select('a')
-    for link in links:
-        extlink = link.get('href')
+    for extlink in record.links:
         display_problems = False
 
         # Not all <a> tags have HREF links
@@ -48,22 +94,35 @@ def parse(postname):
             code = 301
         # Eliminate boilerplate links, allow other links to be investigated
         elif allowlist(extlink):
-            code = 404
-            try:
-                res = requests.get(extlink, timeout=5)
-                code = res.status_code
-            except Exception:
-                code = 408
+            code = codes.get(extlink, 404)
             if (code != requests.codes.ok):
                 display_problems = True
         if display_problems:
-            problems.append(str(code)+' '+extlink)
+            problem = str(code)+' '+extlink
+            if extlink in shorted:
+                problem += SHORTED
+            problems.append(problem)
+
+    return problems
 
-    # If problems with links found, print postname and list of problems
+
+def moved(record, redirects):
+    """ Redirect chain of each link in the post that redirects """
+    chains = []
+    for extlink in dict.fromkeys(record.links):
+        if extlink in redirects:
+            chains.append(' -> '.join('{} {}'.format(code, url)
+                                      for code, url in redirects[extlink]))
+    return chains
+
+
+def report(postname, problems, out_file, label='problems found'):
+    """ If problems with links found, print postname and list of problems """
     if problems:
-        print(postname, '-- problems found:', len(problems), file=out_file)
+        print(postname, '--', label + ':', len(problems), file=out_file)
         for problem in problems:
             print('   ', problem, file=out_file)
+    return None
 
 
 def allowlist(extlink):
@@ -76,16 +135,48 @@ def allowlist(extlink):
 
 if __name__ == "__main__":
     # Redirect all print statements to broken_links.txt file
-    modname = get_modname(sys.argv)
+    modname, parms = get_parms(sys.argv)
     logger = setup_logging(__name__, modname)
     out_file = open('broken_links.txt', 'w')
 
-    filenames = sorted(os.listdir(POSTSDIR))
-    for filename in filenames:
-        # Only process HTML files in this directory
-        if filename.endswith('.html'):
-            postname = os.path.join(POSTSDIR, filename)
-            print('Processing:', postname)
-            parse(postname)
+    # Only process HTML files in this directory
+    postnames = list_docs(POSTSDIR)
+
+    # Links come from the shared metadata store, not the HTML
+    store = PostStore()
+    store.update(postnames)
+    records = [store.get(postname) for postname in postnames]
+    store.close()
+
+    # Check the links of every post together, then report post by post
+    urls = []
+    for record in records:
+        urls.extend(links_to_check(record))
+    # Each distinct link is checked once, and not at all if it was
+    # checked on an earlier run within the time-to-live
+    cache = LinkCache(ttl=parms['ttl']) if parms['use_cache'] else None
+    checker = LinkChecker(parms['limit'], parms['host_limit'])
+    logger.info('Links: {} Limit: {} Per host: {}'.format(
+        len(urls), parms['limit'], parms['host_limit']))
+    codes = checker.check_all(urls, cache)
+    checker.close()
+    shorted = checker.short_circuited
+    print('Links:', len(urls), 'Checked:', checker.checked,
+          'Short-circuited:', len(shorted),
+          'Redirected:', len(checker.redirects))
+    logger.info('Checked: {} Short-circuited: {} Redirected: {}'.format(
+        checker.checked, len(shorted), len(checker.redirects)))
+    if cache:
+        cache.close()
+
+    for postname, record in zip(postnames, records):
+        problems = parse(postname, record, codes, shorted)
+        report(postname, problems, out_file)
+    out_file.close()
+
+    with open(MOVEDFILE, 'w') as moved_file:
+        for postname, record in zip(postnames, records):
+            report(postname, moved(record, checker.redirects), moved_file,
+                   'moved links')
 
     print("Done.")
@@ -2,23 +2,44 @@
 # chktopic.py -- Check if post is in the right topic group
 # By Tony Pearson, IBM, 2020
 #
+# Usage:
+#       ./chktopic.py               Classify posts one at a time
+#       ./chktopic.py --workers 4   Spread posts across 4 processes
+#       ./chktopic.py --nocache     Parse every post, even if unchanged
+#       ./chktopic.py --rescore --title 2 --body 1 --margin 1
+#                                   Redo reclassify.txt from the saved hit
+#                                   matrix with new weights, no parsing
+#
+import functools
+import logging
 import os
 import re
 import operator
 import sys
-from bs4 import BeautifulSoup
-from constants import POSTSDIR, PARSER
-from functions import get_modname, setup_logging
+from concurrent.futures import ProcessPoolExecutor
+from constants import POSTSDIR
+from docArchive import list_docs, read_doc
+from functions import get_modname, get_option, number, setup_logging
 from pageClass import PostPage
+from postExtract import extract
+from postStore import PostStore
+from resultCache import ResultCache, fingerprint
+from hitMatrix import HitMatrix, save_matrix, MATRIXNAME, ACTIONS
 from showProgress import showProgress
+from topicMatcher import TopicMatcher, TITLE_WEIGHT, BODY_WEIGHT
 
 UNITTEST = False
 VERBOSE = False
 NAMERegex = re.compile(r'/[-0123456789]*([a-z]*)[0-9]')
 Tmatch = 'Tmatch: {} {} {}'
 Fmatch = 'Fmatch: {} {} {}'
-POSTEDbyRegex = re.compile(r'posted by: (.*)$')
 LOGMSG = 'Author:{} Postname:{} Permalink:{}'
+OUTLINE = '{} {} {}'
+CACHENAME = 'chktopic.db'
+RESULTS = 'hits'   # change when the contents of a result change
+RESULTFILE = 'reclassify.txt'
+CHUNKSIZE = 8      # posts sent to a worker process at a time
+logger = logging.getLogger(__name__)   # setup_logging when run as a program
 
 TOPICS = {'dpr':   [re.compile(r'ADSTAR'),
                     re.compile(r'ADSM'),
@@ -136,45 +157,81 @@ TOPICS = {'dpr':   [re.compile(r'ADSTAR'),
                     re.compile(r'[aA]ir[-\s][gG]ap')
                     ],
           }
+MATCHER = TopicMatcher(TOPICS)
 
 
 class TopicError(RuntimeError):
     pass
 
 
-def parse(postname):
-    """ Parse the post to extract all words """
-    counts = {}
-    numgroups = 0
-    for topic in TOPICS:
-        counts[topic] = 0
-        numgroups += 1
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    parms = {'workers': max(get_option(argv, '--workers', 1), 1),
+             'use_cache': '--nocache' not in argv,
+             'rescore': '--rescore' in argv,
+             'title': get_option(argv, '--title', TITLE_WEIGHT, number),
+             'body': get_option(argv, '--body', BODY_WEIGHT, number),
+             'margin': get_option(argv, '--margin', 0, number),
+             }
+    return modname, parms
+
+
+def init_worker(modname):
+    """ set up logging within each worker process """
+    global logger
+    logger = logging.getLogger(__name__)
+    if not logger.handlers:
+        logger = setup_logging(__name__, modname)
+    return None
+
 
+def post_topic(postname):
+    """ topic group the post is in now, taken from its file name """
     mo = NAMERegex.search(postname)
     if mo is None:
         logmsg = 'Error, unable to determine topic of post'
         logger.error(logmsg + ': ' + postname)
         raise TopicError(logmsg)
+    return mo.group(1)
 
-    this_topic = mo.group(1)
+
+def parse(postname, record=None):
+    """ Score the post, return its topic counts, blogger and permalink """
+    this_topic = post_topic(postname)
     # import pdb; pdb.set_trace()
-    soup = BeautifulSoup(open(postname), PARSER)
-    title_contents = get_title(soup)
-    file_contents = get_contents(soup)
-    blogger = get_blogger(soup)
-    permalink = get_permalink(soup)
-
-    for topic, patterns in TOPICS.items():
-        for pattern in patterns:
-            mo = pattern.search(title_contents)
-            if mo:
-                logger.info(Tmatch.format(topic, pattern, mo.group()))
-                counts[topic] += 3
-            mo = pattern.search(file_contents)
-            if mo:
-                logger.info(Fmatch.format(topic, pattern, mo.group()))
-                counts[topic] += 1
+    if record is None:
+        record = extract(read_doc(postname))
+    title_contents = record.title
+    file_contents = record.contents
+    blogger = record.blogger
+    permalink = record.permalink
+
+    # Title matches count 3, body matches count 1, per pattern found
+    counts, title_hits, body_hits = MATCHER.score(title_contents,
+                                                  file_contents)
+    for index, mo in title_hits.items():
+        topic, pattern = MATCHER.entries[index]
+        logger.info(Tmatch.format(topic, pattern, mo.group()))
+    for index, mo in body_hits.items():
+        topic, pattern = MATCHER.entries[index]
+        logger.info(Fmatch.format(topic, pattern, mo.group()))
+
+    top_topic, action, stats = decide(this_topic, counts)
+    logger.info(LOGMSG.format(blogger, postname, permalink))
+    result = {'counts': counts,
+              'top_topic': top_topic,
+              'blogger': blogger,
+              'permalink': permalink,
+              'title_hits': sorted(title_hits),
+              'body_hits': sorted(body_hits),
+              }
+    return result
 
+
+def decide(this_topic, counts):
+    """ pick the top topic, return it with the action and stats line """
+    numgroups = len(TOPICS)
     tsort = sorted(counts.items(), key=operator.itemgetter(1), reverse=True)
     top_topic = tsort[0][0]
     if (top_topic != this_topic
@@ -196,91 +253,129 @@ def parse(postname):
         action = 'EVAL'
     else:
         action = 'KEEP'
+    return top_topic, action, stats
 
-    logger.info(LOGMSG.format(blogger, postname, permalink))
-    print(action, stats, permalink, file=output_file)
-    return top_topic
-
-
-def get_title(soup):
-    """ get the title of post """
-    title_contents = ''
-    title_elem = soup.find('h3', attrs={'class': 'blogTitle'})
-    if title_elem:
-        title_contents = title_elem.text.replace('</h3>', '')
-        title_contents.replace('\n', ' ')
-    return title_contents
-
-
-def get_contents(soup):
-    """ get the post contents, minus all the boilerplate """
-    file_contents = ''
-    divs = soup.findAll('div', attrs={'class': 'col-md-12'})
-    if divs:
-        for div in divs:
-            paragraphs = div.findAll('p')
-            for paragraph in paragraphs:
-                file_contents += ' '+paragraph.text
-            paragraphs = div.findAll('table')
-            for paragraph in paragraphs:
-                file_contents += ' '+paragraph.text
-            paragraphs = div.findAll('dl')
-            for paragraph in paragraphs:
-                file_contents += ' '+paragraph.text
-
-    file_contents.replace('\n', ' ')
-    return file_contents
-
-
-def get_blogger(soup):
-    """ get blogger id or name """
-
-    desc = soup.find('meta', attrs={'name': 'description'})
-    byline_id = 'MainCopy_ctl04_ucPermission_UserName_lnkProfile'
-    byline = soup.find('a', attrs={'id': byline_id})
-    blogger = ''
-    if desc:
-        content = desc['content'].split('\n')
-        postedby = content[0]
-        mo = POSTEDbyRegex.search(postedby)
-        if mo:
-            blogger = mo.group(1)
-    else:
-        
-        if byline:
-            blogger = byline.text
-    return blogger
 
+def open_cache():
+    """ result cache for the current pattern table and weights """
+    table = fingerprint(TOPICS, TITLE_WEIGHT, BODY_WEIGHT, RESULTS)
+    return ResultCache(CACHENAME, table)
 
-def get_permalink(soup):
-    """ find permalink within post content """
-    block = soup.find('div', attrs={'class': 'permalink-block'})
-    inside = block.find('input')
-    permalink = inside['value']
-    return permalink
 
+def cache_key(store, postname):
+    """ result cache key: post contents plus the topic it is in now """
+    return '{}:{}'.format(store.digest(postname), post_topic(postname))
 
-if __name__ == "__main__":
-    modname = get_modname(sys.argv)
-    logger = setup_logging(__name__, modname)
 
+def write_results(postnames, results):
+    """ write reclassify.txt and the hit matrix, return posts per topic """
     posts = {}
     for topic in TOPICS:
         posts[topic] = 0
 
-    output_file = open('reclassify.txt', 'w')
+    # Write lines in sorted file order, whether parsed or cached
+    with open(RESULTFILE, 'w') as output_file:
+        for postname in postnames:
+            result = results[postname]
+            top_topic, action, stats = decide(post_topic(postname),
+                                              result['counts'])
+            print(OUTLINE.format(action, stats, result['permalink']),
+                  file=output_file)
+            posts[top_topic] += 1
+
+    # Save which patterns hit each post, for --rescore
+    save_matrix(MATRIXNAME, MATCHER, postnames,
+                [post_topic(postname) for postname in postnames],
+                [results[postname]['permalink'] for postname in postnames],
+                [results[postname] for postname in postnames])
+    return posts
+
+
+def rescore(title_weight, body_weight, margin):
+    """ rewrite reclassify.txt from the saved hit matrix, no parsing """
+    matrix = HitMatrix(MATRIXNAME)
+    actions, counts = matrix.actions(title_weight, body_weight, margin)
+    logger.info('Rescore: title={} body={} margin={}'.format(
+        title_weight, body_weight, margin))
+
+    with open(RESULTFILE, 'w') as output_file:
+        for row, permalink in enumerate(matrix.permalinks):
+            this_topic = matrix.topics[matrix.current[row]]
+            scores = dict(zip(matrix.topics, counts[row].tolist()))
+            top_topic, action, stats = decide(this_topic, scores)
+            print(OUTLINE.format(actions[row], stats, permalink),
+                  file=output_file)
+
+    for action in ACTIONS:
+        print(action, (actions == action).sum())
+    return None
+
+
+if __name__ == "__main__":
+    modname, parms = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+    workers = parms['workers']
+
+    if parms['rescore']:
+        rescore(parms['title'], parms['body'], parms['margin'])
+        print("Done.")
+        sys.exit()
+
+    # Only process HTML files in this directory
+    postnames = [postname for postname in list_docs(POSTSDIR)
+                 if os.path.basename(postname).startswith('20')]
+
+    pool = None
+    mapper = map
+    if workers > 1:
+        logger.info('Workers: {}'.format(workers))
+        pool = ProcessPoolExecutor(workers, initializer=init_worker,
+                                   initargs=(modname,))
+        mapper = functools.partial(pool.map, chunksize=CHUNKSIZE)
+
+    # Bring the shared metadata store up to date, so that only new or
+    # changed posts have their HTML parsed
+    store = PostStore()
+    extracted = store.update(postnames, mapper)
+    logger.info('Extracted: {}'.format(extracted))
+
+    # Only posts that are new or changed since the last run get scored,
+    # the cache key is the file contents plus the topic it is in now
+    cache = None
+    if parms['use_cache']:
+        cache = open_cache()
+    results = {}
+    digests = {}
+    todo = []
+    for postname in postnames:
+        if cache:
+            digests[postname] = cache_key(store, postname)
+            results[postname] = cache.get(digests[postname])
+        if results.get(postname) is None:
+            todo.append(postname)
+    logger.info('Posts: {} To parse: {}'.format(len(postnames), len(todo)))
 
-    filenames = sorted(os.listdir('./' + POSTSDIR))
     dot = showProgress()
-    for filename in filenames:
-        # Only process HTML files in this directory
-        if (filename.startswith('20')
-                and filename.endswith('.html')):
-            dot.show()
-            postname = os.path.join(POSTSDIR, filename)
-            logger.info('Processing: ' + postname)
-            top_topic = parse(postname)
-            posts[top_topic] += 1
+    records = [store.get(postname) for postname in todo]
+    store.close()
+    parsed = mapper(parse, todo, records)
+
+    for postname, result in zip(todo, parsed):
+        dot.show()
+        logger.info('Processed: ' + postname)
+        results[postname] = result
+        if cache:
+            cache.put(digests[postname], result)
+
     dot.end()
+    posts = write_results(postnames, results)
+
+    if pool:
+        pool.shutdown()
+    if cache:
+        logger.info('Cache hits: {}'.format(cache.hits))
+        cache.close()
+    for topic, count in posts.items():
+        logger.info('Topic {}: {} posts'.format(topic, count))
 
     print("Done.")
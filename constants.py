@@ -2,5 +2,6 @@
 FRAMESDIR = 'frames'
 POSTSDIR = 'posts'
 SRCDIR = 'sources'
+CACHEDIR = 'cache'
 
 PARSER = 'lxml'
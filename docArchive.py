@@ -0,0 +1,375 @@
+# docArchive.py -- Compressed, content-addressed store for posts and frames
+#
+# frames/ holds a 380 KB page for every frame, and posts/ a raw HTML file
+# for every post, most of it the same boilerplate.  Once a directory has
+# been packed, with packdocs.py, its documents are kept in a SQLite
+# archive in that directory instead.  Each document is stored once per
+# distinct content, keyed by its SHA-256 hash and compressed with zlib,
+# optionally primed with a dictionary trained on the documents themselves.
+# Any one document can be read by name without unpacking the rest.
+#
+# Tools read and write documents by path, as before.  A loose file is
+# always used if there is one, so directories that were never packed work
+# just as they did.  A document written to a packed directory goes into
+# its archive.  Each process keeps one archive per directory open for all
+# of these calls, shared by its threads, and closes them when it exits.
+#
+#    from docArchive import list_docs, read_doc, write_doc
+#    for postname in list_docs(POSTSDIR):
+#        content = read_doc(postname)
+#
+import atexit
+import collections
+import contextlib
+import functools
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+ARCHIVENAME = 'archive.db'
+LEVEL = 9               # zlib compression level
+DICT_SIZE = 32768       # zlib only looks back 32 KB
+DICT_SAMPLES = 100
+
+SCHEMA = ["""CREATE TABLE IF NOT EXISTS docs (
+                 name TEXT PRIMARY KEY,
+                 digest TEXT,
+                 size INTEGER,
+                 mtime REAL)""",
+          """CREATE TABLE IF NOT EXISTS blobs (
+                 digest TEXT PRIMARY KEY,
+                 dict INTEGER,
+                 data BLOB)""",
+          """CREATE TABLE IF NOT EXISTS dicts (
+                 id INTEGER PRIMARY KEY,
+                 data BLOB)"""]
+
+
+def train_dictionary(samples, size=DICT_SIZE):
+    """
+    zlib preset dictionary from sample documents
+
+    Lines found in at least half of the samples are the boilerplate.  The
+    ones worth most, count times length, go last, where zlib finds them
+    with the shortest distances.
+    """
+    counts = collections.Counter()
+    for sample in samples:
+        counts.update(set(sample.splitlines(keepends=True)))
+    common = [line for line, count in counts.items()
+              if count * 2 >= len(samples) and len(line) > 8]
+    common.sort(key=lambda line: counts[line] * len(line))
+    return b''.join(common)[-size:]
+
+
+def _locked(method):
+    """ One thread at a time uses the connection of an archive """
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class Archive():
+    """ SQLite archive of the documents in one directory """
+
+    def __init__(self, directory, filename=ARCHIVENAME):
+        """ Open or create the archive of this directory """
+        self.directory = directory
+        self.filename = os.path.join(directory, filename)
+        created = not os.path.exists(self.filename)
+        self.db = sqlite3.connect(self.filename, timeout=60,
+                                  check_same_thread=False)
+        if created:
+            for table in SCHEMA:
+                self.db.execute(table)
+        self.dicts = {}
+        self.lock = threading.RLock()
+        self.pid = os.getpid()
+        self.batching = 0
+        return None
+
+    def _commit(self):
+        if not self.batching:
+            self.db.commit()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Commit the writes and removes made inside once, at the end """
+        with self.lock:
+            self.batching += 1
+            try:
+                yield self
+            finally:
+                self.batching -= 1
+                self._commit()
+
+    def _dict(self, dict_id):
+        if dict_id not in self.dicts:
+            row = self.db.execute('SELECT data FROM dicts WHERE id = ?',
+                                  (dict_id,)).fetchone()
+            self.dicts[dict_id] = row[0] if row else b''
+        return self.dicts[dict_id]
+
+    @_locked
+    def names(self):
+        """ Names of all the documents, sorted """
+        return [name for (name,) in
+                self.db.execute('SELECT name FROM docs ORDER BY name')]
+
+    @_locked
+    def stat(self, name):
+        """ (size, mtime) of a document, or None if not archived """
+        return self.db.execute('SELECT size, mtime FROM docs WHERE name = ?',
+                               (name,)).fetchone()
+
+    @_locked
+    def read(self, name):
+        """ Contents of a document """
+        row = self.db.execute('SELECT dict, data FROM docs JOIN blobs '
+                              'USING (digest) WHERE name = ?',
+                              (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(os.path.join(self.directory, name))
+        dict_id, data = row
+        if dict_id:
+            inflate = zlib.decompressobj(zdict=self._dict(dict_id))
+            return inflate.decompress(data) + inflate.flush()
+        return zlib.decompress(data)
+
+    @_locked
+    def write(self, name, content, mtime=None):
+        """ Store a document, sharing the blob with any identical one """
+        digest = hashlib.sha256(content).hexdigest()
+        known = self.db.execute('SELECT 1 FROM blobs WHERE digest = ?',
+                                (digest,)).fetchone()
+        if not known:
+            row = self.db.execute('SELECT max(id) FROM dicts').fetchone()
+            dict_id = row[0] or 0
+            if dict_id:
+                deflate = zlib.compressobj(LEVEL, zdict=self._dict(dict_id))
+                data = deflate.compress(content) + deflate.flush()
+            else:
+                data = zlib.compress(content, LEVEL)
+            self.db.execute('INSERT INTO blobs VALUES (?, ?, ?)',
+                            (digest, dict_id, data))
+        self.db.execute('INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)',
+                        (name, digest, len(content),
+                         time.time() if mtime is None else mtime))
+        self._commit()
+        return digest
+
+    @_locked
+    def remove(self, name):
+        """ Forget a document, and its blob if nothing else uses it """
+        self.db.execute('DELETE FROM docs WHERE name = ?', (name,))
+        self.db.execute('DELETE FROM blobs WHERE digest NOT IN '
+                        '(SELECT digest FROM docs)')
+        self._commit()
+        return self
+
+    @_locked
+    def train(self, samples=DICT_SAMPLES):
+        """ Train a dictionary on stored documents, used for new blobs """
+        names = self.names()
+        step = max(len(names) // samples, 1)
+        zdict = train_dictionary([self.read(name)
+                                  for name in names[::step][:samples]])
+        if zdict:
+            self.db.execute('INSERT INTO dicts (data) VALUES (?)', (zdict,))
+            self._commit()
+        return len(zdict)
+
+    @_locked
+    def recompress(self):
+        """ Compress every blob again, with the newest dictionary """
+        with self.batch():
+            for (digest,) in self.db.execute('SELECT digest FROM blobs'
+                                             ).fetchall():
+                name = self.db.execute('SELECT name FROM docs '
+                                       'WHERE digest = ?',
+                                       (digest,)).fetchone()[0]
+                content = self.read(name)
+                self.db.execute('DELETE FROM blobs WHERE digest = ?',
+                                (digest,))
+                self.write(name, content, self.stat(name)[1])
+        self.db.execute('VACUUM')
+        return self
+
+    @_locked
+    def sizes(self):
+        """ (documents, blobs, bytes stored, bytes compressed) """
+        docs, size = self.db.execute('SELECT count(*), sum(size) FROM docs'
+                                     ).fetchone()
+        blobs, packed = self.db.execute('SELECT count(*), sum(length(data)) '
+                                        'FROM blobs').fetchone()
+        return docs, blobs, size or 0, packed or 0
+
+    @_locked
+    def close(self):
+        self.db.commit()
+        self.db.close()
+        return None
+
+
+_archives = {}          # directory to its open archive, in this process
+_archives_lock = threading.Lock()
+
+
+def open_archive(directory):
+    """
+    Archive of this directory, or None if it was never packed
+
+    The same open archive is returned every time, do not close it.  One
+    inherited from the parent process is not used, a process started by
+    fork gets its own.
+    """
+    key = os.path.abspath(directory)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive and archive.pid != os.getpid():
+            archive = None
+        if not os.path.exists(os.path.join(directory, ARCHIVENAME)):
+            if archive:             # unpacked since
+                archive.close()
+            _archives.pop(key, None)
+            return None
+        if archive is None:
+            archive = _archives[key] = Archive(directory)
+        return archive
+
+
+@atexit.register
+def close_archives():
+    """ Close the archives this process opened """
+    with _archives_lock:
+        for archive in _archives.values():
+            if archive.pid == os.getpid():
+                archive.close()
+        _archives.clear()
+    return None
+
+
+def _split(path):
+    directory, name = os.path.split(path)
+    return open_archive(directory or '.'), name
+
+
+def list_docs(directory, suffix='.html'):
+    """ Paths of every document in a directory, loose or archived """
+    names = set()
+    if os.path.isdir(directory):
+        names.update(name for name in os.listdir(directory)
+                     if name.endswith(suffix))
+    archive = open_archive(directory)
+    if archive:
+        names.update(name for name in archive.names()
+                     if name.endswith(suffix))
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def read_doc(path):
+    """ Contents of a document, from a loose file or the archive """
+    if os.path.exists(path):
+        with open(path, 'rb') as file_obj:
+            return file_obj.read()
+    archive, name = _split(path)
+    if archive is None:
+        raise FileNotFoundError(path)
+    return archive.read(name)
+
+
+def doc_mtime(path):
+    """ Modification time of a document, None if there is no such one """
+    if os.path.exists(path):
+        return os.stat(path).st_mtime
+    archive, name = _split(path)
+    if archive is None:
+        return None
+    row = archive.stat(name)
+    return row[1] if row else None
+
+
+def doc_exists(path):
+    """ True if there is a document at this path """
+    return doc_mtime(path) is not None
+
+
+def write_doc(path, content):
+    """ Write a document into the archive if packed, else a loose file """
+    archive, name = _split(path)
+    if archive is None:
+        with open(path, 'wb') as file_obj:
+            file_obj.write(content)
+        return None
+    archive.write(name, content)
+    if os.path.exists(path):     # a stale loose copy would be read first
+        os.unlink(path)
+    return None
+
+
+def remove_doc(path):
+    """ Remove a document, loose or archived """
+    if os.path.exists(path):
+        os.unlink(path)
+    archive, name = _split(path)
+    if archive:
+        archive.remove(name)
+    return None
+
+
+if __name__ == "__main__":
+    import tempfile
+    print('Testing: ', sys.argv[0])
+
+    directory = tempfile.mkdtemp()
+    page = (b'<html><head><title>Boilerplate</title></head>\n'
+            + b'<div class="nav">Storage Community menu</div>\n' * 50)
+    pages = [page + '<p>Post {}</p>\n'.format(n).encode() for n in range(20)]
+
+    # Loose files work as they always have
+    write_doc(os.path.join(directory, 'a.html'), pages[0])
+    assert list_docs(directory) == [os.path.join(directory, 'a.html')]
+    assert read_doc(os.path.join(directory, 'a.html')) == pages[0]
+
+    # Once packed, documents go into the archive, identical ones once
+    archive = Archive(directory)
+    archive.close()
+    for n, content in enumerate(pages + pages[:5]):
+        write_doc(os.path.join(directory, 'p{:02}.html'.format(n)), content)
+    write_doc(os.path.join(directory, 'a.html'), pages[1])
+    names = list_docs(directory)
+    assert len(names) == 26 and not os.path.exists(names[0])
+    assert read_doc(names[0]) == pages[1]
+    assert read_doc(names[-1]) == pages[4]
+    assert doc_exists(names[-1]) and not doc_exists(names[0] + 'x')
+
+    archive = Archive(directory)
+    docs, blobs, size, packed = archive.sizes()
+    assert docs == 26 and blobs == 20
+    print('Plain:', size, 'bytes in', packed)
+    assert archive.train() > 0
+    archive.recompress()
+    docs, blobs, size, trained = archive.sizes()
+    print('Trained:', size, 'bytes in', trained)
+    assert trained < packed and archive.read('p03.html') == pages[3]
+    archive.close()
+
+    # Removing a document drops its blob once nothing shares it
+    remove_doc(names[-1])
+    remove_doc(os.path.join(directory, 'p19.html'))
+    archive = Archive(directory)
+    assert archive.sizes()[:2] == (24, 19)
+    archive.close()
+    try:
+        read_doc(names[-1])
+        assert False, 'removed document still read'
+    except FileNotFoundError:
+        pass
+
+    print('Congratulations')
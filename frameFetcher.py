@@ -0,0 +1,151 @@
+# frameFetcher.py -- Frames of a topic group over plain HTTP
+#
+# FramePage has the browser render every 380 KB frame, and waits for the
+# old one to go stale after each click on », although all that is kept
+# is the HTML.  Once HomePage.login has signed in, its cookies are put
+# into a keep-alive requests session and the frames are fetched directly.
+# The » button is an ASP.NET postback, so the next frame is a POST of the
+# page's form with __EVENTTARGET set to the target of the button.
+#
+# FrameFetcher does the same as FramePage, so getframes.get_frames can
+# use either:
+#
+#    from frameFetcher import FrameFetcher, cookie_session
+#    session = cookie_session(home.cookies(), home.user_agent())
+#    frame = FrameFetcher(session, logger)
+#    frame.load_from_key('fla')
+#
+import re
+import sys
+from urllib.parse import urljoin
+from lxml import html
+from docArchive import write_doc
+from httpSession import make_session, TIMEOUT
+from pageClass import COMFRAME, COMKEYS, cookie_jar
+
+POSTBACK = re.compile(r"__doPostBack\('([^']*)','([^']*)'\)")
+CURRENT = ('//span[contains(concat(" ", @class, " "), '
+           '" CurrentPageLabel ")]')
+PAGER = '//ul[contains(concat(" ", @class, " "), " pagination ")]'
+ENCODING = 'utf-8'      # else lxml takes it for latin-1, and finds no »
+
+
+def cookie_session(cookies, user_agent=None, workers=1):
+    """ Keep-alive session with the cookies of a signed-in browser """
+    session = make_session(workers)
+    session.cookies.update(cookie_jar(cookies))
+    if user_agent:
+        session.headers['User-Agent'] = user_agent
+    return session
+
+
+class FrameFetcher():
+    """ Frames of a topic group, fetched and paged without a browser """
+
+    def __init__(self, session, logger, frame_url=COMFRAME):
+        self.session = session
+        self.logger = logger
+        self.frame_url = frame_url
+        self.url = ''
+        self.key = ''
+        self.content = b''
+        self.tree = None
+
+    def _load(self, response):
+        response.raise_for_status()
+        self.url = response.url
+        self.content = response.content
+        parser = html.HTMLParser(encoding=ENCODING)   # one per thread
+        self.tree = html.fromstring(self.content, parser=parser)
+        return self
+
+    def load_from_key(self, comkey):
+        self.url = self.frame_url.format(COMKEYS[comkey])
+        self.logger.debug('FrameURL: {}'.format(self.url))
+        self.key = comkey
+        return self._load(self.session.get(self.url, timeout=TIMEOUT))
+
+    def title(self):
+        return (self.tree.findtext('.//title') or '').strip()
+
+    def frame_id(self):
+        # Same names as FramePage, a frame without a pager is page 1
+        currentp = self.tree.xpath(CURRENT)
+        label = currentp[0].text_content().strip() if currentp else '1'
+        pagenum = label.rjust(8 - len(self.key), '0')
+        return self.key + pagenum
+
+    def _postback(self):
+        """ (target, argument) of the » button, None on the last page """
+        pagers = self.tree.xpath(PAGER)
+        if not pagers:
+            return None
+        for link in pagers[0].iter('a'):
+            if link.text_content().strip() == '»':
+                # On the last page it is disabled, and has no href
+                match = POSTBACK.search(link.get('href') or '')
+                return match.groups() if match else None
+        return None
+
+    def next_page(self):
+        postback = self._postback()
+        if postback is None:
+            return False
+        form = self.tree.forms[0]
+        fields = dict(form.form_values())
+        fields['__EVENTTARGET'], fields['__EVENTARGUMENT'] = postback
+        before = self.frame_id()
+        self._load(self.session.post(urljoin(self.url, form.get('action')),
+                                     data=fields, timeout=TIMEOUT))
+        if self.frame_id() == before:
+            self.logger.warning('Frame {} came back again'.format(before))
+            return False
+        return True
+
+    def write_page(self, filename):
+        """ write the page source to file """
+        write_doc(filename, self.content)
+        return self
+
+
+if __name__ == "__main__":
+    import logging
+    import os
+    import tempfile
+    from docArchive import list_docs, read_doc
+    from pageClass import FRAMESDIR
+    from standIn import FrameReplay
+    print('Testing: ', sys.argv[0])
+
+    # Page through the captured frames, replayed by a local stand-in
+    logger = logging.getLogger(__name__)
+    replay = FrameReplay(FRAMESDIR, cookie='session')
+    comkey = [key for key, value in COMKEYS.items()
+              if value in replay.pages][0]
+    session = cookie_session([{'name': 'session', 'value': 'x',
+                               'domain': '127.0.0.1'}], 'Stand-in')
+    frame = FrameFetcher(session, logger, replay.frame_url)
+    frame.load_from_key(comkey)
+    assert 'Community Blog' in frame.title()
+
+    directory = tempfile.mkdtemp()
+    names = []
+    more_pages = True
+    while more_pages:
+        names.append(os.path.join(directory, frame.frame_id() + '.html'))
+        frame.write_page(names[-1])
+        more_pages = frame.next_page()
+    session.close()
+    replay.close()
+
+    captured = list_docs(FRAMESDIR)
+    print(len(names), 'frames of', comkey, 'fetched,',
+          len(captured), 'captured')
+    assert len(names) == replay.pages[COMKEYS[comkey]] == len(captured)
+    assert names[0].endswith(comkey + '00001.html')
+    for name, capture in zip(names, captured):
+        marker = re.compile(rb'<input type="hidden" name="__REPLAYPAGE"'
+                            rb' value="\d+" />')
+        assert marker.sub(b'', read_doc(name)) == read_doc(capture)
+
+    print('Congratulations')
@@ -0,0 +1,120 @@
+# frameManifest.py -- Post links of every frame, kept between runs
+#
+# getframes.py usually only brings a few frames up to date, but
+# scanframes.py used to parse every frame again on each run.  The post
+# links found in each frame are kept in a small SQLite table with the
+# frame's modification time and a hash of its contents.  A frame is only
+# parsed again if it is new or its contents changed; a frame that was
+# only touched gets its new time recorded.
+#
+#    from frameManifest import FrameManifest
+#    manifest = FrameManifest()
+#    if manifest.is_current(framename):
+#        links = manifest.get(framename)
+#
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from constants import CACHEDIR
+from docArchive import doc_mtime, read_doc
+
+MANIFESTNAME = 'frames.db'
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS frames (
+                framename TEXT PRIMARY KEY,
+                mtime REAL,
+                digest TEXT,
+                links TEXT)"""
+
+
+def frame_digest(content):
+    """ SHA-256 of the contents of a frame """
+    return hashlib.sha256(content).hexdigest()
+
+
+class FrameManifest():
+    """ SQLite table of the post links in each frame """
+
+    def __init__(self, filename=MANIFESTNAME):
+        """ Open or create the manifest in CACHEDIR """
+        os.makedirs(CACHEDIR, exist_ok=True)   # store in sub-directory
+        self.filename = os.path.join(CACHEDIR, filename)
+        self.db = sqlite3.connect(self.filename)
+        self.db.execute(SCHEMA)
+        return None
+
+    def is_current(self, framename):
+        """ True if the stored links are from the frame as it is now """
+        row = self.db.execute('SELECT mtime, digest FROM frames '
+                              'WHERE framename = ?', (framename,)).fetchone()
+        if row is None:
+            return False
+        mtime = doc_mtime(framename)
+        if row[0] == mtime:
+            return True
+        if row[1] != frame_digest(read_doc(framename)):
+            return False
+        self.db.execute('UPDATE frames SET mtime = ? WHERE framename = ?',
+                        (mtime, framename))
+        return True
+
+    def get(self, framename):
+        """ Stored post links of this frame, or None """
+        row = self.db.execute('SELECT links FROM frames WHERE framename = ?',
+                              (framename,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, framename, mtime, digest, links):
+        """ Store the post links of a frame """
+        self.db.execute('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?)',
+                        (framename, mtime, digest, json.dumps(links)))
+        return self
+
+    def forget(self, framenames):
+        """ Drop frames not in this list, they are gone, and save """
+        known = set(framenames)
+        rows = self.db.execute('SELECT framename FROM frames').fetchall()
+        for (framename,) in rows:
+            if framename not in known:
+                self.db.execute('DELETE FROM frames WHERE framename = ?',
+                                (framename,))
+        self.db.commit()
+        return self
+
+    def close(self):
+        """ Save and close the manifest """
+        self.db.commit()
+        self.db.close()
+        return None
+
+
+if __name__ == "__main__":
+    import tempfile
+    print('Testing: ', sys.argv[0])
+
+    frame = os.path.join(tempfile.mkdtemp(), 'fla00001.html')
+    with open(frame, 'wb') as file_obj:
+        file_obj.write(b'<a class="BlogTitle" href="/x">x</a>')
+    manifest = FrameManifest('test_frames.db')
+    assert not manifest.is_current(frame) and manifest.get(frame) is None
+    manifest.put(frame, doc_mtime(frame), frame_digest(read_doc(frame)),
+                 ['/x'])
+    assert manifest.is_current(frame) and manifest.get(frame) == ['/x']
+
+    # Touched but the same is still current, changed is not
+    os.utime(frame, (0, 0))
+    assert manifest.is_current(frame)
+    with open(frame, 'ab') as file_obj:
+        file_obj.write(b'<a class="BlogTitle" href="/y">y</a>')
+    os.utime(frame, (1, 1))
+    assert not manifest.is_current(frame)
+
+    # Frames that are gone are forgotten
+    manifest.forget([])
+    assert manifest.get(frame) is None
+    manifest.close()
+    os.unlink(manifest.filename)
+
+    print('Congratulations')
@@ -4,12 +4,14 @@
 #
 # To include these functions, use:
 #
-#    from functions import get_modname, setup_logging
+#    from functions import get_modname, get_option, setup_logging
 #
 
 import datetime
 import logging
+import math
 import re
+import sys
 
 
 def get_modname(argv):
@@ -20,6 +22,34 @@ def get_modname(argv):
     return modname
 
 
+def number(text):
+    """ int if the text is a whole number, otherwise float """
+    value = float(text)
+    if value.is_integer():
+        return int(value)
+    return value
+
+
+def percentile(values, pct):
+    """ pct percentile of values, nearest rank """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def get_option(argv, name, default, kind=int):
+    """ value that follows --name on the command line, or the default """
+    if name not in argv:
+        return default
+    pos = argv.index(name)
+    try:
+        return kind(argv[pos + 1])
+    except (IndexError, ValueError):
+        print('   Error, {} needs a value'.format(name))
+        sys.exit()
+
+
 def setup_logging(name, module):
     """ Setup logging level, filename and format of log entries """
     today = datetime.datetime.now()
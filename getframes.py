@@ -13,6 +13,36 @@
     $ getframes.py
     (without parameters will delete all previous frames, and
      fetch all the frames from all topic groups)
+
+    $ getframes.py --workers 7
+    (fetch up to 7 topic groups at once, each in its own browser)
+
+    $ getframes.py --direct
+    (sign in with the browser, then fetch the frames over HTTP)
+
+    $ getframes.py --login
+    (sign in again, even if the login saved by the last run is good)
+
+    $ getframes.py --show
+    (show the browser window, by default there is none if the login
+     can be done automatically with login_credentials.key)
+
+    Browsers come from pageClass.make_driver, which does not load
+    images, media or tracker scripts, and returns from each page load
+    once its HTML is parsed.
+
+    The cookies of each login are saved in cache/login.json.  The next
+    run checks with a plain request that they are still signed in and
+    then reuses them, so the sign-in steps only run when they expire.
+
+    With --workers, one browser signs in and the others take its
+    cookies, so there is only one login.  Each browser pages through
+    its own topic groups and writes their frames.
+
+    With --direct, the browser is only used to sign in.  Its cookies
+    go into a keep-alive HTTP session and the frames are fetched and
+    paged through without rendering them, see frameFetcher.py.  This
+    also works with --workers, fetching that many topic groups at once.
 """
 
 # imports
@@ -21,18 +51,24 @@ import re
 import sys
 import logging
 import datetime
-from selenium import webdriver
+from concurrent.futures import ThreadPoolExecutor
+from docArchive import list_docs, remove_doc
+from frameFetcher import FrameFetcher, cookie_session
 from logSystem import logSystem
-from pageClass import HomePage, FramePage, COMKEYS, FRAMESDIR
-from functions import get_modname, setup_logging
+from pageClass import HomePage, FramePage, COMKEYS, FRAMESDIR, make_driver
+from functions import get_modname, get_option, setup_logging
 
 TOPICS = list(COMKEYS.keys())
 
 def get_parms(argv):
 
+    workers = max(get_option(argv, '--workers', 1), 1)
+    args = [arg for pos, arg in enumerate(argv[1:])
+            if not arg.startswith('--') and argv[pos] != '--workers']
+
     # Allow individual topic, '*', or nothing (which defaults to *)
-    if len(argv) > 1:
-        comkey = argv[1]
+    if args:
+        comkey = args[0]
         if comkey != '*' and comkey not in COMKEYS:
             print('   Error, invalid topic group "' + comkey + '"')
             print('   Parameter must be one of: ', ', '.join(TOPICS))
@@ -41,12 +77,15 @@ def get_parms(argv):
             sys.exit()
     else:
         comkey = '*'
-    return comkey
+    direct = '--direct' in argv
+    fresh = '--login' in argv
+    headless = False if '--show' in argv else None
+    return comkey, workers, direct, fresh, headless
 
 
-def get_frames(comkey):
+def get_frames(frame):
     """ Fetch all frame files and put them in frames directory. """
-    logger.info('Topic Group: {}'.format(browser.title))
+    logger.info('Topic Group: {}'.format(frame.title()))
 
     # Fetch frames one at a time until no more found
     more_pages = True
@@ -60,14 +99,32 @@ def get_frames(comkey):
     return None
 
 
+def get_topic(topic, cookies, headless=None):
+    """ In a browser of its own, fetch all frames of one topic group """
+    browser = make_driver(headless)
+    try:
+        HomePage(browser, logger).share_login(cookies)
+        frame = FramePage(browser, logger)
+        frame.load_from_key(topic)
+        get_frames(frame)
+    finally:
+        browser.quit()
+    return topic
+
+
+def get_topic_direct(topic, session):
+    """ Over HTTP, without a browser, fetch all frames of one group """
+    frame = FrameFetcher(session, logger)
+    frame.load_from_key(topic)
+    get_frames(frame)
+    return topic
+
+
 def remove_old_frames():
     """ remove all previous HTML frame files """
-    for filename in os.listdir(FRAMESDIR):
-        file_path = os.path.join(FRAMESDIR, filename)
+    for file_path in list_docs(FRAMESDIR):
         try:
-            if (os.path.isfile(file_path)
-                    and filename.endswith('.html')):
-                os.unlink(file_path)
+            remove_doc(file_path)
         except Exception as e:
             failure = 'Failed to delete {}'.format(file_path)
             print('{} {}'.format(failure, e))
@@ -79,7 +136,7 @@ if __name__ == "__main__":
     # Parse input parameters and setup logging -- DEFAULT
     logsys = logSystem(sys.argv)
     logger = logsys.setup(__name__)
-    comkey = get_parms(sys.argv)
+    comkey, workers, direct, fresh, headless = get_parms(sys.argv)
 
     # If the ./frames subdirectory does not already exist, create it
     # otherwise if we are doing all topics, remove all previous frames
@@ -88,20 +145,35 @@ if __name__ == "__main__":
         remove_old_frames()
 
     # Use Selenium to launch web browser to handle JavaScript
-    browser = webdriver.Chrome()
+    browser = make_driver(headless)
     home = HomePage(browser, logger)
-    home.login()
+    home.login(fresh)
 
     # If no topic provided, process all topics
-    frame = FramePage(browser, logger)
-    if comkey == '*':
-        for topic in TOPICS:
-            frame.load_from_key(topic)
-            get_frames(topic)
+    topics = TOPICS if comkey == '*' else [comkey]
+    if direct:
+        session = cookie_session(home.cookies(), home.user_agent(), workers)
+        browser.quit()
+        with ThreadPoolExecutor(min(workers, len(topics))) as pool:
+            for topic in pool.map(get_topic_direct, topics,
+                                  [session] * len(topics)):
+                logger.info('Finished topic group {}'.format(topic))
+        session.close()
+    elif workers > 1 and len(topics) > 1:
+        cookies = home.cookies()
+        browser.quit()
+        logger.info('Workers: {}'.format(workers))
+        with ThreadPoolExecutor(min(workers, len(topics))) as pool:
+            for topic in pool.map(get_topic, topics,
+                                  [cookies] * len(topics),
+                                  [headless] * len(topics)):
+                logger.info('Finished topic group {}'.format(topic))
     else:
-        frame.load_from_key(comkey)
-        get_frames(comkey)
+        frame = FramePage(browser, logger)
+        for topic in topics:
+            frame.load_from_key(topic)
+            get_frames(frame)
 
-    # Use Selenium to shutdown Firefox browser
-    browser.quit()
+        # Use Selenium to shutdown Firefox browser
+        browser.quit()
     print('Done.')
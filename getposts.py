@@ -9,17 +9,46 @@
 #       ./getposts.py               This option will delete all previous posts
 #       ./getposts.py flash         Process flash001 to flash999 frames
 #       ./getposts.py flash007      Process just the flash007 frame
+#       ./getposts.py --workers 16  Fetch 16 posts at once, default 8
+#       ./getposts.py --fresh       Fetch every post, even if done before
+#       ./getposts.py --refresh     Ask again for posts done before, and
+#                                   fetch only the ones that have changed
+#
+# Posts are fetched by a pool of threads sharing one keep-alive session,
+# so connections to the blog server are reused.  Failed requests and
+# busy answers are retried with backoff.  permalink.txt is written in the
+# same order as postlist.txt, however the fetches finish.
+#
+# The same post often shows up in several frames, so post links are
+# compared without their query string and each post is fetched once.
+# Every finished post is added to a manifest as soon as it is written, so
+# a rerun, or a run after a crash, only fetches what is still missing.
+#
+# The ETag and Last-Modified headers of each saved post are kept next to
+# it, in a .http file.  With --refresh they are sent back, and a post the
+# server says is not modified is neither transferred nor written again.
+#
+# Most posts in the frames belong to other bloggers.  Each post is parsed
+# as it arrives, and as soon as the author is known a post by someone
+# else is dropped, closing the connection without reading the rest.
 #
 # import pdb; pdb.set_trace() - for debug
 
+import json
+import logging
 import os
 import re
 import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit, urlunsplit
 from selenium import webdriver
-from bs4 import BeautifulSoup
-from functions import get_modname, setup_logging
-from pageClass import HomePage, PostPage, FRAMESDIR, POSTSDIR, PARSER
+from lxml import etree
+from functions import get_modname, get_option, setup_logging
+from constants import CACHEDIR
+from docArchive import doc_exists, list_docs, remove_doc, write_doc
+from httpSession import make_session, TIMEOUT
+from pageClass import HomePage, PostPage, FRAMESDIR, POSTSDIR
 from showProgress import showProgress
 
 
@@ -29,55 +58,187 @@ DATEregex = re.compile(r'/(20\d\d/[01]\d/[0-3]\d)/')
 FRAME_DATE = 'Last date for {} is {}'
 FRAME_SEQ = 'Blog {} after Topic {} Last Date {}'
 BLOGLINK = 'tony-pearson1'
+WORKERS = 8         # posts fetched at once
+MANIFEST = os.path.join(CACHEDIR, 'downloads.txt')
+OTHER = '-'         # manifest entry for a post by someone else
+VALIDATORS = '.http'
+CONDITIONS = {'ETag': 'If-None-Match', 'Last-Modified': 'If-Modified-Since'}
+BYLINE_ID = 'MainCopy_ctl04_ucPermission_UserName_lnkProfile'
+CHUNK = 8192        # bytes read at a time
+logger = logging.getLogger(__name__)
 
 def get_parms(argv):
     modname = get_modname(argv)
+    workers = max(get_option(argv, '--workers', WORKERS), 1)
 
     # Allow individual keyword that can match the frames file
     # Examples:  flash (all flashNNN) or flash007 (just this frame)
-    if len(argv) > 1:
-        keyw = argv[1]
-    else:
-        keyw = '.'   # matches all files
-    return modname, keyw
+    keyw = '.'   # matches all files
+    args = argv[1:]
+    for pos, arg in enumerate(args):
+        if not arg.startswith('--') and not (pos and
+                                             args[pos - 1] == '--workers'):
+            keyw = arg
+            break
+    return modname, keyw, workers, '--fresh' in argv, '--refresh' in argv
 
 
-def follow(postlink, topic):
-    """ Fetch post content and check meta data """
-    logger.debug('Attempting: {}'.format(postlink))
-    r = requests.get(postlink)
-    post = BeautifulSoup(r.content, PARSER)
-
-    desc = post.find('meta', attrs={'name': 'description'})
-    byline_id = 'MainCopy_ctl04_ucPermission_UserName_lnkProfile'
-    byline = post.find('a', attrs={'id': byline_id})
-    # print('DESC:', desc, 'BYLINE:', byline)
-
-    belongs_to_blogger = False
-
-    # Older posts use meta tag description, newer posts use byline
-    if desc:
-        content = desc['content'].split('\n')
-        postedby = content[0]
-        logger.info(postedby)
-        if BLOGID.search(postedby):
-            belongs_to_blogger = True
-    else:
-        if BLOGID.search(byline.text):
-            belongs_to_blogger = True
-
-    if belongs_to_blogger:
-        block = post.find('div', attrs={'class': 'permalink-block'})
-        inside = block.find('input')
-        permalink = inside['value']
-        print(topic, permalink, file=perm_file)
-        postname = make_name(permalink, topic)
-        with open(postname, 'wb') as file_obj:
-            file_obj.write(r.content)
-        logger.info('Tony: {}'.format(postname))
+def post_key(postlink):
+    """ Post link without query string or fragment, to spot repeats """
+    parts = urlsplit(postlink)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path.rstrip('/'), '', ''))
+
+
+def read_manifest(filename=MANIFEST):
+    """
+    Posts finished on earlier runs, as a dictionary of post key to result
+
+    The result is (topic, permalink, postname), or None for a post that
+    belongs to someone else.  Posts whose file has since gone are left
+    out, as is a last line cut short by a crash.
+    """
+    done = {}
+    if os.path.exists(filename):
+        with open(filename, 'r') as in_file:
+            for line in in_file:
+                fields = line.split()
+                if not line.endswith('\n') or len(fields) != 4:
+                    continue
+                key, topic, permalink, postname = fields
+                if permalink == OTHER:
+                    done[key] = None
+                elif doc_exists(postname):
+                    done[key] = topic, permalink, postname
+    return done
+
+
+def open_manifest(fresh=False, filename=MANIFEST):
+    """ Open the manifest to add to, or to start again if fresh """
+    if fresh or not os.path.exists(filename):
+        return open(filename, 'w')
+    cut_short = False
+    if os.path.getsize(filename):
+        with open(filename, 'rb') as in_file:
+            in_file.seek(-1, os.SEEK_END)
+            cut_short = in_file.read(1) != b'\n'
+    manifest = open(filename, 'a')
+    if cut_short:
+        print(file=manifest)    # keep the next entry on a line of its own
+    return manifest
+
+
+def add_manifest(manifest, key, result):
+    """ Record a finished post, straight to disk """
+    topic, permalink, postname = result or (OTHER, OTHER, OTHER)
+    print(key, topic, permalink, postname, file=manifest, flush=True)
+    return None
+
+
+def read_validators(postname):
+    """ Conditional request headers for a saved post, if it has any """
+    try:
+        with open(postname + VALIDATORS, 'r') as in_file:
+            saved = json.load(in_file)
+    except (OSError, ValueError):
+        return {}
+    return {CONDITIONS[name]: value for name, value in saved.items()
+            if name in CONDITIONS}
+
+
+def save_validators(postname, headers):
+    """ Keep the ETag and Last-Modified of a post next to it """
+    saved = {name: headers[name] for name in CONDITIONS if name in headers}
+    if saved:
+        with open(postname + VALIDATORS, 'w') as out_file:
+            json.dump(saved, out_file)
+    elif os.path.exists(postname + VALIDATORS):
+        os.unlink(postname + VALIDATORS)
     return None
 
 
+class PostError(RuntimeError):
+    pass
+
+
+class PostSniffer():
+    """
+    Author and permalink of a post, read as its bytes arrive
+
+    Older posts use meta tag description, in the head, newer posts use
+    the byline.  postedby is set as soon as either has been seen, and
+    permalink once the input in the permalink block has.
+    """
+
+    def __init__(self):
+        self.parser = etree.HTMLPullParser(events=('start', 'end'))
+        self.postedby = None
+        self.permalink = None
+
+    def feed(self, chunk):
+        """ Parse the next part of the post """
+        self.parser.feed(chunk)
+        for event, elem in self.parser.read_events():
+            if self.postedby is None:
+                if (event == 'start' and elem.tag == 'meta'
+                        and elem.get('name') == 'description'):
+                    self.postedby = elem.get('content', '').split('\n')[0]
+                elif (event == 'end' and elem.tag == 'a'
+                        and elem.get('id') == BYLINE_ID):
+                    self.postedby = ''.join(elem.itertext())
+            if (event == 'start' and elem.tag == 'input'
+                    and self.permalink is None
+                    and any('permalink-block' in div.get('class', '').split()
+                            for div in elem.iterancestors('div'))):
+                self.permalink = elem.get('value')
+        return self
+
+
+def follow(postlink, topic, session=requests, known=None):
+    """
+    Fetch post content and check meta data
+
+    Posts that belong to the blogger are written to POSTSDIR, and
+    (topic, permalink, postname) returned.  Other posts return None, as
+    soon as their author is known.  known is the result for this post
+    from an earlier run; the post is only fetched if it changed since,
+    otherwise known itself is returned.  An error answer, or a page with
+    no author or permalink, raises rather than pass for someone else's
+    post, so it is tried again on the next run.
+    """
+    logger.debug('Attempting: {}'.format(postlink))
+    headers = read_validators(known[2]) if known else {}
+    with session.get(postlink, timeout=TIMEOUT, headers=headers,
+                     stream=True) as r:
+        if known and r.status_code == requests.codes.not_modified:
+            logger.debug('Not modified: {}'.format(known[2]))
+            return known
+        r.raise_for_status()
+
+        sniffer = PostSniffer()
+        chunks = []
+        for chunk in r.iter_content(CHUNK):
+            # Either one can come first, parse until both are known
+            if sniffer.postedby is None or sniffer.permalink is None:
+                sniffer.feed(chunk)
+            chunks.append(chunk)
+            # Leaving here closes the connection, the rest is never read
+            if (sniffer.postedby is not None
+                    and not BLOGID.search(sniffer.postedby)):
+                logger.info(sniffer.postedby)
+                return None
+        headers = r.headers
+
+    if sniffer.postedby is None or sniffer.permalink is None:
+        raise PostError('No author or permalink')
+    logger.info(sniffer.postedby)
+    postname = make_name(sniffer.permalink, topic)
+    write_doc(postname, b''.join(chunks))
+    save_validators(postname, headers)
+    logger.info('Tony: {}'.format(postname))
+    return topic, sniffer.permalink, postname
+
+
 def make_name(linkurl, topic):
     """ generate file name from permalink in POSTSDIR directory """
     fileRegex = re.compile(r'^(.*)/(20\d\d)/(\d\d)/(\d\d)/(.*)$')
@@ -90,31 +251,80 @@ def make_name(linkurl, topic):
 
 def remove_old_posts(keyw):
     """ remove all previous HTML frame files """
-    for filename in os.listdir(POSTSDIR):
-        file_path = os.path.join(POSTSDIR, filename)
+    for file_path in list_docs(POSTSDIR):
         try:
-            if (os.path.isfile(file_path)
-                    and (keyw in filename)
-                    and filename.endswith('.html')):
-                os.unlink(file_path)
+            if keyw in os.path.basename(file_path):
+                remove_doc(file_path)
+                if os.path.exists(file_path + VALIDATORS):
+                    os.unlink(file_path + VALIDATORS)
         except Exception as e:
             print('Failed to delete %s. Reason: %s' % (file_path, e))
     return None
 
 
 if __name__ == "__main__":
-    modname, keyw = get_parms(sys.argv)
+    modname, keyw, workers, fresh, refresh = get_parms(sys.argv)
     logger = setup_logging(__name__, modname)
 
+    os.makedirs(POSTSDIR, exist_ok=True)
+    os.makedirs(CACHEDIR, exist_ok=True)
+    with open('postlist.txt', 'r') as in_file:
+        lines = in_file.read().splitlines()
+
+    # Each post once, in the topic of the first frame it showed up in
+    posts = {}
+    for line in lines:
+        topic, postlink = line.split(' ')
+        key = post_key(postlink)
+        if key not in posts:
+            posts[key] = topic, postlink
+        elif posts[key][0] != topic:
+            logger.info('Also in {}: {}'.format(topic, postlink))
+    results = {} if fresh else read_manifest()
+    done = len([key for key in posts if key in results])
+    if refresh:
+        # Posts by someone else will not become ours, skip those
+        todo = [key for key in posts if results.get(key, True)]
+    else:
+        todo = [key for key in posts if key not in results]
+    logger.info('Lines: {} Posts: {} Done before: {} To fetch: {}'.format(
+        len(lines), len(posts), done, len(todo)))
+
+    # Fetch in any order, but keep the results in postlist.txt order
+    session = make_session(workers)
+    dot = showProgress()
+    with ThreadPoolExecutor(workers) as pool, \
+            open_manifest(fresh) as manifest:
+        futures = {}
+        for key in todo:
+            topic, postlink = posts[key]
+            futures[pool.submit(follow, postlink, topic, session,
+                                results.get(key))] = key
+        unchanged = 0
+        failed = 0
+        for future in as_completed(futures):
+            dot.show()
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:    # one bad post must not stop us
+                logger.error('Failed: {} {}'.format(posts[key][1], exc))
+                failed += 1
+                continue
+            if result is not None and result is results.get(key):
+                unchanged += 1      # not modified, already in the manifest
+                continue
+            results[key] = result
+            add_manifest(manifest, key, result)
+    dot.end()
+    session.close()
+
     with open('permalink.txt', 'w') as perm_file:
-        os.makedirs(POSTSDIR, exist_ok=True)
-        dot = showProgress()
-        with open('postlist.txt', 'r') as in_file:
-            lines = in_file.read().splitlines()
-            for line in lines:
-                dot.show()
-                topic, postlink = line.split(' ')
-                follow(postlink, topic)
-        dot.end()
+        for key in posts:
+            if results.get(key):
+                topic, permalink, postname = results[key]
+                print(topic, permalink, file=perm_file)
+    print('Posts:', len(posts), 'Fetched:', len(todo) - unchanged - failed,
+          'Not modified:', unchanged, 'Failed:', failed)
 
     print('Done')
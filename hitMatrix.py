@@ -0,0 +1,122 @@
+# hitMatrix.py -- Posts by patterns hit matrix for fast re-scoring
+#
+# chktopic.py records which patterns matched the title and the body of
+# every post.  Saved as two posts x patterns planes of 0/1 values, the
+# topic counts for any title and body weights are just two matrix
+# products, so new weights and thresholds can be tried across the whole
+# corpus without parsing a single post.
+#
+#    from hitMatrix import HitMatrix, save_matrix
+#    save_matrix(filename, matcher, postnames, current, permalinks, results)
+#    matrix = HitMatrix(filename)
+#    actions = matrix.actions(title_weight=3, body_weight=1)
+#
+import os
+import sys
+import numpy as np
+from constants import CACHEDIR
+
+MATRIXNAME = 'hits.npz'
+ACTIONS = np.array(['KEEP', 'MOVE', 'EVAL'])
+
+
+def save_matrix(filename, matcher, postnames, current, permalinks, results):
+    """ Save title and body hit planes for posts, in the given order """
+    topics = matcher.topics
+    title = np.zeros((len(postnames), len(matcher.entries)), dtype=np.uint8)
+    body = np.zeros_like(title)
+    for row, result in enumerate(results):
+        title[row, result['title_hits']] = 1
+        body[row, result['body_hits']] = 1
+
+    pattern_topic = [topics.index(topic) for topic, p in matcher.entries]
+    os.makedirs(CACHEDIR, exist_ok=True)   # store in sub-directory
+    np.savez_compressed(os.path.join(CACHEDIR, filename),
+                        postnames=np.array(postnames, dtype=str),
+                        current=np.array([topics.index(topic)
+                                          for topic in current]),
+                        permalinks=np.array(permalinks, dtype=str),
+                        title=title,
+                        body=body,
+                        topics=np.array(topics, dtype=str),
+                        pattern_topic=np.array(pattern_topic))
+    return None
+
+
+class HitMatrix():
+    """ Hit planes saved by chktopic.py, with vectorized scoring """
+
+    def __init__(self, filename):
+        """ Load the hit planes from CACHEDIR """
+        with np.load(os.path.join(CACHEDIR, filename)) as data:
+            self.postnames = data['postnames']
+            self.current = data['current']
+            self.permalinks = data['permalinks']
+            self.title = data['title']
+            self.body = data['body']
+            self.topics = list(data['topics'])
+            pattern_topic = data['pattern_topic']
+
+        # One-hot patterns x topics, to add up hits per topic
+        self.onehot = np.zeros((len(pattern_topic), len(self.topics)),
+                               dtype=np.int32)
+        self.onehot[np.arange(len(pattern_topic)), pattern_topic] = 1
+        self.title_counts = self.title @ self.onehot
+        self.body_counts = self.body @ self.onehot
+        return None
+
+    def counts(self, title_weight, body_weight):
+        """ posts x topics scores for these weights """
+        return (self.title_counts * title_weight
+                + self.body_counts * body_weight)
+
+    def actions(self, title_weight, body_weight, margin=0):
+        """
+        KEEP, MOVE or EVAL for every post, and the posts x topics scores
+
+        A post moves when the best topic beats its current topic by more
+        than margin.  Otherwise it needs evaluating if another topic ties
+        with the top score, the same rules as chktopic.decide.
+        """
+        counts = self.counts(title_weight, body_weight)
+        rows = np.arange(len(counts))
+        best = counts.max(axis=1)
+        mine = counts[rows, self.current]
+        ties = (counts == best[:, None]).sum(axis=1)
+
+        choice = np.zeros(len(counts), dtype=int)             # KEEP
+        move = best - mine > margin
+        choice[move] = 1                                       # MOVE
+        choice[~move & (best == mine) & (ties > 1)] = 2        # EVAL
+        return ACTIONS[choice], counts
+
+
+if __name__ == "__main__":
+    import re
+    from topicMatcher import TopicMatcher
+    print('Testing: ', sys.argv[0])
+
+    topics = {'fla': [re.compile(r'Flash'), re.compile(r'SSD')],
+              'tap': [re.compile(r'[tT]ape')],
+              'san': [re.compile(r'SAN')]}
+    matcher = TopicMatcher(topics)
+    results = [{'title_hits': [0], 'body_hits': [0, 1, 2]},  # fla wins
+               {'title_hits': [], 'body_hits': [2, 3]},      # tie tap/san
+               {'title_hits': [2], 'body_hits': [0]},        # tap wins
+               ]
+    save_matrix('test_hits.npz', matcher, ['a', 'b', 'c'],
+                ['tap', 'tap', 'tap'], ['x', 'y', 'z'], results)
+    matrix = HitMatrix('test_hits.npz')
+    actions, counts = matrix.actions(3, 1)
+    print(counts.tolist(), actions.tolist())
+    assert counts.tolist() == [[5, 1, 0], [0, 1, 1], [1, 3, 0]]
+    assert actions.tolist() == ['MOVE', 'EVAL', 'KEEP']
+
+    # Heavier body weight moves the last post, unless a margin holds it
+    actions, counts = matrix.actions(1, 3)
+    assert actions.tolist() == ['MOVE', 'EVAL', 'MOVE']
+    actions, counts = matrix.actions(1, 3, margin=2)
+    assert actions.tolist() == ['MOVE', 'EVAL', 'KEEP']
+    os.unlink(os.path.join(CACHEDIR, 'test_hits.npz'))
+
+    print('Congratulations')
@@ -0,0 +1,53 @@
+# httpSession.py -- Keep-alive HTTP session shared by the fetchers
+#
+# getposts.py, pipeline.py and frameFetcher.py all fetch many pages from
+# the same server.  They share one requests session, so connections are
+# kept open and reused, with a connection pool as big as the number of
+# threads using it.  Failed requests and busy answers are retried with
+# backoff.
+#
+#    from httpSession import make_session, TIMEOUT
+#    session = make_session(workers=8)
+#    res = session.get(url, timeout=TIMEOUT)
+#
+import sys
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_SIZE = 8       # connections kept open to each host
+TIMEOUT = 30        # seconds
+RETRIES = 3         # tries again after errors and busy answers
+BACKOFF = 0.5       # seconds, doubled for each retry
+RETRY_CODES = (429, 500, 502, 503, 504)
+
+
+def make_session(workers=POOL_SIZE):
+    """ Keep-alive session for all fetches, retrying with backoff """
+    retry = Retry(total=RETRIES, backoff_factor=BACKOFF,
+                  status_forcelist=RETRY_CODES)
+    adapter = HTTPAdapter(pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+if __name__ == "__main__":
+    from standIn import StandIn
+    print('Testing: ', sys.argv[0])
+
+    stand_in = StandIn(hosts=1, latency=0)
+    host = stand_in.hosts[0]
+    session = make_session(2)
+    assert session.get(host + 'ok/a', timeout=TIMEOUT).status_code == 200
+    assert session.get(host + 'gone/a', timeout=TIMEOUT).status_code == 404
+    try:
+        session.get(host + 'error/a', timeout=TIMEOUT)
+        assert False, 'server error not retried'
+    except requests.exceptions.RetryError:
+        pass
+    session.close()
+    stand_in.close()
+
+    print('Congratulations')
@@ -0,0 +1,132 @@
+# linkCache.py -- Remember link status codes between runs
+#
+# Most links in old posts do not change from one run of chklinks.py to
+# the next.  The status code of every link checked is kept in a small
+# SQLite database with the time it was checked.  Codes older than the
+# time-to-live are checked again, and once the cache holds more than
+# max_entries links the ones used longest ago are dropped.  Links that
+# redirect also keep their redirect chain.
+#
+# A link that timed out, could not be reached or got a busy server is
+# most likely fine again soon, so those codes are only trusted for
+# failed_ttl, an hour, rather than the full time-to-live.
+#
+#    from linkCache import LinkCache
+#    cache = LinkCache(ttl=7 * 86400)
+#    code, chain = cache.get(url)     # None if never seen or expired
+#
+import json
+import os
+import sqlite3
+import sys
+import time
+from constants import CACHEDIR
+
+CACHENAME = 'links.db'
+TTL = 7 * 24 * 3600     # one week, in seconds
+FAILED_TTL = 3600       # one hour, for the codes below
+TRANSIENT_CODES = (408, 429, 500, 502, 503, 504)   # 408: not reached
+MAX_ENTRIES = 50000
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS links (
+                url TEXT PRIMARY KEY,
+                code INTEGER,
+                checked REAL,
+                used REAL,
+                chain TEXT)"""
+
+
+class LinkCache():
+    """ Persistent url to status code cache with TTL and LRU eviction """
+
+    def __init__(self, filename=CACHENAME, ttl=TTL,
+                 max_entries=MAX_ENTRIES, failed_ttl=FAILED_TTL):
+        """ Open or create the cache database in CACHEDIR """
+        os.makedirs(CACHEDIR, exist_ok=True)   # store in sub-directory
+        self.filename = os.path.join(CACHEDIR, filename)
+        self.ttl = ttl
+        self.failed_ttl = min(failed_ttl, ttl)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(self.filename)
+        self.db.execute(SCHEMA)
+        columns = [row[1] for row in
+                   self.db.execute('PRAGMA table_info(links)')]
+        if 'chain' not in columns:     # made before chains were kept
+            self.db.execute("ALTER TABLE links ADD chain TEXT DEFAULT '[]'")
+        return None
+
+    def get(self, url):
+        """ Cached code and redirect chain of url, None if unknown or old """
+        now = time.time()
+        row = self.db.execute('SELECT code, checked, chain FROM links '
+                              'WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        ttl = self.failed_ttl if row[0] in TRANSIENT_CODES else self.ttl
+        if now - row[1] > ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute('UPDATE links SET used = ? WHERE url = ?',
+                        (now, url))
+        return row[0], [tuple(hop) for hop in json.loads(row[2])]
+
+    def put(self, url, code, chain=()):
+        """ Remember the status code and redirects of url, checked now """
+        now = time.time()
+        self.db.execute('INSERT OR REPLACE INTO links VALUES '
+                        '(?, ?, ?, ?, ?)',
+                        (url, code, now, now, json.dumps(list(chain))))
+        return self
+
+    def evict(self):
+        """ Remove least recently used entries beyond max_entries """
+        self.db.execute("""DELETE FROM links WHERE url IN (
+                               SELECT url FROM links
+                               ORDER BY used DESC LIMIT -1 OFFSET ?)""",
+                        (self.max_entries,))
+        return self
+
+    def close(self):
+        """ Evict, save and close the cache """
+        self.evict()
+        self.db.commit()
+        self.db.close()
+        return None
+
+
+if __name__ == "__main__":
+    print('Testing: ', sys.argv[0])
+
+    cache = LinkCache('test_links.db', ttl=0.2, max_entries=2)
+    cache.put('http://a/', 200).put('http://b/', 404)
+    time.sleep(0.01)
+    cache.put('http://c/', 200, [(301, 'http://c/'), (200, 'http://d/')])
+    assert cache.get('http://b/') == (404, [])
+    assert cache.get('http://x/') is None
+    cache.close()
+
+    # Least recently used entry is gone, the others expire after the TTL
+    cache = LinkCache('test_links.db', ttl=0.2, max_entries=2)
+    assert cache.get('http://a/') is None
+    assert cache.get('http://c/') == (200, [(301, 'http://c/'),
+                                            (200, 'http://d/')])
+    time.sleep(0.3)
+    assert cache.get('http://c/') is None
+    cache.close()
+    os.unlink(cache.filename)
+
+    # Links that could not be reached are checked again much sooner
+    cache = LinkCache('test_links.db', ttl=60, failed_ttl=0.2)
+    cache.put('http://a/', 404).put('http://b/', 408).put('http://c/', 503)
+    assert cache.get('http://b/') == (408, [])
+    time.sleep(0.3)
+    assert cache.get('http://a/') == (404, [])
+    assert cache.get('http://b/') is None and cache.get('http://c/') is None
+    cache.close()
+    os.unlink(cache.filename)
+
+    print('Congratulations')
@@ -0,0 +1,326 @@
+# linkChecker.py -- Check many links at once, politely
+#
+# Checking links one at a time means every dead host costs the full
+# timeout before the next link is even tried.  This checks links
+# concurrently with asyncio: a global limit caps how many requests are in
+# flight, and a per-host limit keeps us from hammering any one server.
+# Requests go through one shared requests.Session, so connections to the
+# same host are pooled and kept alive, running on a thread pool sized to
+# the global limit.
+#
+# The same link often shows up in dozens of posts, so links are first
+# normalized and each distinct one is only checked once.  A LinkCache can
+# be passed in to skip links checked recently on an earlier run.
+#
+# Hosts that have been dead for years would still cost a full timeout
+# for every link to them.  After FAILURE_LIMIT timeouts or connection
+# failures in a row, the circuit for that host opens and its remaining
+# links are marked without a request.  After COOLDOWN seconds one request
+# is let through again, and if it gets any answer the circuit closes.
+#
+# Only the status line and headers are ever read.  Each link is probed
+# with HEAD, falling back to a streamed GET that is closed as soon as the
+# headers arrive when a server rejects HEAD.  Redirects are followed by
+# hand, up to MAX_HOPS, so the whole chain of a moved link is known.
+#
+#    from linkChecker import LinkChecker
+#    codes = LinkChecker().check_all(urls)      # {url: status code}
+#
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+GLOBAL_LIMIT = 32      # requests in flight at once
+HOST_LIMIT = 4         # requests in flight to any one host
+TIMEOUT = 5            # seconds
+TIMEOUT_CODE = 408     # reported when a link cannot be reached at all
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+FAILURE_LIMIT = 3      # failures in a row before a host is skipped
+COOLDOWN = 60          # seconds before a skipped host is tried again
+MAX_HOPS = 10          # redirects followed before giving up
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+HEAD_REJECTED = (400, 403, 405, 501)   # try GET when HEAD gets these
+
+
+def normalize_url(url):
+    """ Same link, same text: lower case scheme and host, no fragment """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    port = DEFAULT_PORTS.get(scheme)
+    if port and netloc.endswith(port):
+        netloc = netloc[:-len(port)]
+    path = parts.path or '/'
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+
+class HostHealth():
+    """
+    Circuit breaker for each host
+
+    A host is closed (requests allowed) until failure_limit failures in a
+    row open it.  Once cooldown seconds have passed it is half-open: one
+    trial request is allowed, which closes it on success or opens it
+    again on failure.
+    """
+
+    def __init__(self, failure_limit=FAILURE_LIMIT, cooldown=COOLDOWN):
+        self.failure_limit = failure_limit
+        self.cooldown = cooldown
+        self.failures = {}
+        self.opened = {}
+        self.trials = set()
+
+    def allow(self, host):
+        """ True if a request to this host should be made """
+        if host not in self.opened:
+            return True
+        if host in self.trials:
+            return False
+        if time.monotonic() - self.opened[host] < self.cooldown:
+            return False
+        self.trials.add(host)      # half-open, let one request through
+        return True
+
+    def success(self, host):
+        """ Host answered, close its circuit """
+        self.failures.pop(host, None)
+        self.opened.pop(host, None)
+        self.trials.discard(host)
+        return None
+
+    def failure(self, host):
+        """ Host timed out or refused, open its circuit if too many """
+        self.trials.discard(host)
+        self.failures[host] = self.failures.get(host, 0) + 1
+        if (self.failures[host] >= self.failure_limit
+                or host in self.opened):
+            self.opened[host] = time.monotonic()
+        return None
+
+
+class LinkChecker():
+    """ Concurrent link checker with global and per-host limits """
+
+    def __init__(self, limit=GLOBAL_LIMIT, host_limit=HOST_LIMIT,
+                 timeout=TIMEOUT, failure_limit=FAILURE_LIMIT,
+                 cooldown=COOLDOWN):
+        self.limit = limit
+        self.host_limit = host_limit
+        self.timeout = timeout
+        self.health = HostHealth(failure_limit, cooldown)
+        self.short_circuited = set()
+        self.redirects = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=limit, pool_maxsize=host_limit)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.checked = 0
+        return None
+
+    def probe(self, url):
+        """ Status code and Location of one url, without any body """
+        res = self.session.head(url, timeout=self.timeout,
+                                allow_redirects=False)
+        res.close()
+        if res.status_code in HEAD_REJECTED:
+            # Closing a streamed response drops the body unread
+            res = self.session.get(url, timeout=self.timeout,
+                                   allow_redirects=False, stream=True)
+            res.close()
+        return res.status_code, res.headers.get('Location')
+
+    def fetch(self, url):
+        """
+        Status code of one link, TIMEOUT_CODE if it cannot be reached
+
+        Also returns True if the host itself failed, timed out or
+        refused the connection, rather than the link being bad, and the
+        redirect chain as a list of (code, url) ending with the final
+        answer, or an empty list if the link did not redirect.
+        """
+        failed = False
+        chain = []
+        try:
+            for hop in range(MAX_HOPS + 1):
+                code, location = self.probe(url)
+                chain.append((code, url))
+                if code not in REDIRECT_CODES or not location:
+                    break
+                url = urljoin(url, location)
+        except (requests.Timeout, requests.ConnectionError):
+            code = TIMEOUT_CODE
+            failed = not chain
+            chain.append((code, url))
+        except Exception:
+            code = TIMEOUT_CODE
+            chain.append((code, url))
+        if len(chain) == 1:
+            chain = []
+        return code, failed, chain
+
+    async def _check(self, url, executor, limit, hosts):
+        host = urlsplit(url).netloc.lower()
+        if host not in hosts:
+            hosts[host] = asyncio.Semaphore(self.host_limit)
+        loop = asyncio.get_running_loop()
+        async with hosts[host]:
+            if not self.health.allow(host):
+                self.short_circuited.add(url)
+                return url, (TIMEOUT_CODE, [])
+            async with limit:
+                code, failed, chain = await loop.run_in_executor(
+                    executor, self.fetch, url)
+        if failed:
+            self.health.failure(host)
+        else:
+            self.health.success(host)
+        return url, (code, chain)
+
+    async def _check_all(self, urls):
+        limit = asyncio.Semaphore(self.limit)
+        hosts = {}
+        with ThreadPoolExecutor(self.limit) as executor:
+            tasks = [self._check(url, executor, limit, hosts)
+                     for url in urls]
+            results = await asyncio.gather(*tasks)
+        return dict(results)
+
+    def check_all(self, urls, cache=None):
+        """
+        Check every distinct link once, return a dictionary of url to code
+
+        Links that differ only in case of the host, a default port or a
+        #fragment are the same link.  Codes found in cache are used
+        without a request, and new codes are saved to it.  Links skipped
+        because their host's circuit was open are not cached, and are
+        listed in self.short_circuited by their original url.  Links
+        that redirect have their chain in self.redirects, also by their
+        original url.
+        """
+        self.short_circuited = set()
+        normal = {}
+        for url in urls:
+            normal[url] = normalize_url(url)
+
+        results = {}
+        todo = []
+        for link in dict.fromkeys(normal.values()):
+            result = cache.get(link) if cache else None
+            if result is None:
+                todo.append(link)
+            else:
+                results[link] = result
+
+        if todo:
+            checked = asyncio.run(self._check_all(todo))
+            results.update(checked)
+            if cache:
+                for link, (code, chain) in checked.items():
+                    if link not in self.short_circuited:
+                        cache.put(link, code, chain)
+        self.checked = len(todo) - len(self.short_circuited)
+        self.short_circuited = {url for url, link in normal.items()
+                                if link in self.short_circuited}
+        self.redirects = {url: results[link][1]
+                          for url, link in normal.items() if results[link][1]}
+        return {url: results[link][0] for url, link in normal.items()}
+
+    def close(self):
+        self.session.close()
+        return None
+
+
+if __name__ == "__main__":
+    import os
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    print('Testing: ', sys.argv[0])
+
+    class Handler(BaseHTTPRequestHandler):
+        """ 200 for /ok, 404 for anything else, after a short delay """
+        def do_HEAD(self):
+            time.sleep(0.2)
+            if self.path.startswith('/nohead'):
+                self.send_response(405)          # GET only
+            elif self.path.startswith('/old'):
+                self.send_response(301)          # moved to /ok
+                self.send_header('Location', '/ok' + self.path[4:])
+            else:
+                self.send_response(200 if self.path.startswith('/ok')
+                                   else 404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            if self.path.startswith('/nohead'):
+                self.path = '/ok'
+            self.do_HEAD()
+            gets.append(self.path)
+
+        def log_message(self, *args):
+            pass
+
+    gets = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:{}/'.format(server.server_port)
+
+    urls = [base + 'ok{}'.format(n) for n in range(20)]
+    urls += [base + 'gone', 'http://127.0.0.1:1/refused']
+    urls += [base + 'ok0#top']
+    checker = LinkChecker(limit=8, host_limit=8, timeout=2)
+    start = time.time()
+    codes = checker.check_all(urls)
+    elapsed = time.time() - start
+
+    print(len(codes), 'links in {:.2f} seconds'.format(elapsed))
+    assert codes[base + 'ok0'] == 200
+    assert codes[base + 'gone'] == 404
+    assert codes['http://127.0.0.1:1/refused'] == TIMEOUT_CODE
+    assert checker.checked == 22  # the #top link is the same as ok0
+    assert elapsed < 21 * 0.2     # far quicker than one at a time
+    assert not gets               # HEAD was enough for every link
+
+    # Moved links are followed, servers that refuse HEAD get a GET
+    codes = checker.check_all([base + 'old1', base + 'nohead'])
+    assert codes == {base + 'old1': 200, base + 'nohead': 200}
+    assert checker.redirects == {base + 'old1': [(301, base + 'old1'),
+                                                 (200, base + 'ok1')]}
+    assert gets == ['/ok']
+
+    # Second run with a cache only checks what it has not seen
+    from linkCache import LinkCache
+    cache = LinkCache('test_links.db', failed_ttl=0)
+    checker.check_all(urls[:10], cache)
+    codes = checker.check_all(urls, cache)
+    assert checker.checked == 12 and codes[base + 'gone'] == 404
+    checker.check_all([base + 'old1'], cache)
+    checker.check_all([base + 'old1'], cache)
+    assert checker.checked == 0 and base + 'old1' in checker.redirects
+    checker.check_all(['http://127.0.0.1:1/refused'], cache)
+    assert checker.checked == 1   # not reached is not trusted for long
+    cache.close()
+    os.unlink(cache.filename)
+
+    # A dead host trips its circuit, so most of its links are skipped
+    checker.close()
+    checker = LinkChecker(limit=8, host_limit=2, timeout=2)
+    dead = ['http://127.0.0.1:1/dead{}'.format(n) for n in range(10)]
+    codes = checker.check_all(dead)
+    print('Short-circuited:', len(checker.short_circuited))
+    assert set(codes.values()) == {TIMEOUT_CODE}
+    assert len(checker.short_circuited) >= 10 - FAILURE_LIMIT - 2
+    assert checker.checked + len(checker.short_circuited) == 10
+    checker.close()
+    server.shutdown()
+
+    print('Congratulations')
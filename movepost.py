@@ -2,6 +2,15 @@
 # movepost.py -- Move posts to new topic group
 # By Tony Pearson, IBM, 2020
 #
+# Usage:
+#       ./movepost.py                 Move the posts listed in reclassify.txt
+#       ./movepost.py movelist.txt    Move the posts listed in movelist.txt
+#       ./movepost.py --login         Sign in again, even if the login
+#                                     saved by the last run is still good
+#       ./movepost.py --show          Show the browser window, by default
+#                                     there is none if the login can be
+#                                     done with login_credentials.key
+#
 import os
 import re
 import operator
@@ -9,13 +18,12 @@ import sys
 import time
 import datetime
 from bs4 import BeautifulSoup
-from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from functions import get_modname, setup_logging
-from pageClass import HomePage, PostPage, EDIT_ID, TITLE_ID
+from pageClass import HomePage, PostPage, EDIT_ID, TITLE_ID, make_driver
 from showProgress import showProgress
 
 TOPICS = {
@@ -41,11 +49,14 @@ VERBOSE = True
 def get_parms(argv):
     """ get parameters passed in from command line """
     modname = get_modname(argv)
-    if len(argv) < 2:
+    args = [arg for arg in argv[1:] if not arg.startswith('--')]
+    if not args:
         movename = 'reclassify.txt'
     else:
-        movename = argv[1]
-    return modname, movename
+        movename = args[0]
+    fresh = '--login' in argv
+    headless = False if '--show' in argv else None
+    return modname, movename, fresh, headless
 
 
 def move_post(topic, permalink):
@@ -162,13 +173,13 @@ def make_logname(stem):
 
 
 if __name__ == "__main__":
-    modname, movename = get_parms(sys.argv)
+    modname, movename, fresh, headless = get_parms(sys.argv)
     logger = setup_logging(__name__, modname)
 
     # Use Selenium to launch browser
 
-    browser = webdriver.Chrome()
-    storage_community = HomePage(browser, logger).login()
+    browser = make_driver(headless)
+    storage_community = HomePage(browser, logger).login(fresh)
 
     lines_read, posts_moved = 0, 0
     redo = []
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# packdocs.py -- Pack posts and frames into compressed archives
+#
+# Moves the loose HTML files of posts/ and frames/ into an archive.db in
+# each directory, see docArchive.py.  Every tool reads and writes the
+# documents by name as before, and anything written later goes straight
+# into the archive.  Modification times are kept, so the post store does
+# not extract the posts again.
+#
+# Usage:
+#       ./packdocs.py                 Pack posts/ and frames/
+#       ./packdocs.py frames          Pack just frames/
+#       ./packdocs.py --train         Also train a dictionary on the
+#                                     documents and compress them again
+#       ./packdocs.py --unpack posts  Back to loose files, no archive
+#
+import os
+import sys
+from constants import FRAMESDIR, POSTSDIR
+from docArchive import Archive, ARCHIVENAME
+from functions import get_modname, setup_logging
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    directories = [arg.rstrip('/') for arg in argv[1:]
+                   if not arg.startswith('--')]
+    for directory in directories:
+        if not os.path.isdir(directory):
+            print('   Error, no directory "' + directory + '"')
+            sys.exit()
+    parms = {'directories': directories or [POSTSDIR, FRAMESDIR],
+             'train': '--train' in argv,
+             'unpack': '--unpack' in argv,
+             }
+    return modname, parms
+
+
+def pack(directory, train=False):
+    """ Move loose HTML files into the archive of the directory """
+    archive = Archive(directory)
+    packed = []
+    with archive.batch():       # one commit for the lot
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith('.html') and os.path.isfile(path):
+                with open(path, 'rb') as file_obj:
+                    archive.write(name, file_obj.read(),
+                                  os.stat(path).st_mtime)
+                packed.append(path)
+    for path in packed:         # only once they are safely in the archive
+        os.unlink(path)
+    if train and archive.train():
+        archive.recompress()
+    sizes = archive.sizes()
+    archive.close()
+    return sizes
+
+
+def unpack(directory):
+    """ Write archived documents back as loose files, remove the archive """
+    archive = Archive(directory)
+    for name in archive.names():
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as file_obj:
+            file_obj.write(archive.read(name))
+        mtime = archive.stat(name)[1]
+        os.utime(path, (mtime, mtime))
+    archive.close()
+    os.unlink(os.path.join(directory, ARCHIVENAME))
+    return None
+
+
+if __name__ == "__main__":
+    modname, parms = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+
+    for directory in parms['directories']:
+        if parms['unpack']:
+            unpack(directory)
+            print(directory, 'unpacked')
+            logger.info('Unpacked {}'.format(directory))
+            continue
+        docs, blobs, size, packed = pack(directory, parms['train'])
+        on_disk = os.path.getsize(os.path.join(directory, ARCHIVENAME))
+        print('{}: {} documents, {} distinct, {:,} bytes packed into {:,},'
+              ' archive {:,} bytes'.format(directory, docs, blobs, size,
+                                           packed, on_disk))
+        logger.info('Packed {} Documents: {} Bytes: {} Archive: {}'.format(
+            directory, docs, size, on_disk))
+
+    print("Done.")
@@ -1,19 +1,99 @@
 import os
+import re
+import json
+import time
 import logging
 import requests
 from selenium import webdriver
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
+from constants import CACHEDIR
+from docArchive import read_doc, write_doc
+from postExtract import extract
 
 # import pdb; pdb.set_trace()
 
 FRAMESDIR = 'frames'
 POSTSDIR = 'posts'
 PARSER = 'lxml'
+LOGINFILE = 'login.json'
+CREDENTIALS = 'login_credentials.key'
+IMPLICIT_WAIT = 60          # seconds
+PAGE_LOAD_TIMEOUT = 120     # seconds
+# A page that still offers to sign in was not served to a signed-in user
+SIGNIN = re.compile(r'>\s*Sign In\s*<')
+PROBE_TIMEOUT = 30
+
+
+# Images and media are not needed to read or edit a page
+MEDIA = ['png', 'jpg', 'jpeg', 'gif', 'svg', 'webp', 'ico',
+         'mp4', 'webm', 'mp3', 'woff', 'woff2', 'ttf']
+# Trackers, tag managers, consent and social widgets on the community
+# pages.  The CDNs serving the site's own scripts are left alone.
+THIRD_PARTY = ['tiqcdn.com', 'tealiumiq.com', 'mathtag.com',
+               'coremetrics.com', 'crwdcntrl.net', 'segment.com',
+               'google-analytics.com', 'googletagmanager.com', 'hotjar.com',
+               'facebook.com', 'facebook.net', 'twitter.com', 'linkedin.com',
+               'youtube.com', 'truste.com', 'trustarc.com',
+               'fonts.googleapis.com', 'fonts.gstatic.com',
+               'use.fortawesome.com']
+
+
+def blocked_urls(images=True, hosts=True):
+    """ Chrome DevTools url patterns of the requests not to make """
+    patterns = []
+    if images:
+        patterns += ['*.{}*'.format(ext) for ext in MEDIA]
+    if hosts:
+        for host in THIRD_PARTY:
+            patterns += ['*://{}/*'.format(host), '*://*.{}/*'.format(host)]
+    return patterns
+
+
+def make_driver(headless=None, eager=True, block_images=True,
+                block_hosts=True, screenshots=False):
+    """
+    Chrome set up for fetching pages rather than looking at them
+
+    headless runs without a window; by default only when the login can
+    be automatic, as a manual login needs the window.  eager returns from
+    a page load once the HTML is parsed, not after every image and script
+    has loaded; the pages wait for the elements they need anyway.  Images,
+    media and fonts, and the third-party hosts in THIRD_PARTY, can be
+    blocked.  screenshot() only writes PNGs if screenshots is set.
+    """
+    if headless is None:
+        headless = os.path.exists(CREDENTIALS)
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless')
+        options.add_argument('--window-size=1920,1080')  # desktop menus
+    if eager:
+        options.set_capability('pageLoadStrategy', 'eager')
+    if block_images:
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2})
+    driver = webdriver.Chrome(options=options)
+    patterns = blocked_urls(block_images, block_hosts)
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    driver.screenshots = screenshots
+    return driver
+
+
+def cookie_jar(cookies):
+    """ requests cookie jar holding the cookies of a browser """
+    jar = requests.cookies.RequestsCookieJar()
+    for cookie in cookies:
+        jar.set(cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    return jar
+
 
 class LoginError(RuntimeError):
     pass
@@ -28,22 +108,28 @@ class BasePage(object):
 
     def __init__(self, driver, logger):
         self.driver = driver
-        self.driver.implicitly_wait(60)
-        self.driver.set_page_load_timeout(120)
+        self.driver.implicitly_wait(IMPLICIT_WAIT)
+        self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        # Only drivers from make_driver(screenshots=True) take them
+        self.screenshots = getattr(driver, 'screenshots', False)
 
         self.pagename = 'BasePage'
         self.logger = logger
         self.url = ''
 
     def screenshot(self, index):
+        if not self.screenshots:
+            return None
         shotname = 'screen-' + self.pagename + index + '.png'
         self.driver.get_screenshot_as_file(shotname)
 
+    def title(self):
+        return self.driver.title
+
     def write_page(self, filename):
         source = self.driver.page_source
         """ write the page source to file """
-        with open(filename, 'wb') as file_obj:
-            file_obj.write(source.encode(encoding='utf-8'))
+        write_doc(filename, source.encode(encoding='utf-8'))
         return self
 
 
@@ -53,7 +139,8 @@ class HomePage(BasePage):
     def __init__(self, driver, logger):
         super().__init__(driver, logger)
         self.url = 'https://community.ibm.com/community/user/storage/home'
-        self.credentials = 'login_credentials.key'
+        self.credentials = CREDENTIALS
+        self.login_file = os.path.join(CACHEDIR, LOGINFILE)
         self.pagename = 'HomePage'
 
     def _click_signin(self):
@@ -108,7 +195,18 @@ class HomePage(BasePage):
             raise LoginError('Invalid credentials')
         return
 
-    def login(self):
+    def login(self, fresh=False):
+        """ reuse the saved login if still good, else log in and save it """
+        saved = None if fresh else self.saved_login()
+        if saved and self.probe(saved['cookies'], saved.get('user_agent')):
+            self.logger.info('Reusing login saved in {}'.format(
+                self.login_file))
+            return self.share_login(saved['cookies'])
+        self.sign_in()
+        self.save_login()
+        return self
+
+    def sign_in(self):
         """ automatically or manually log in """
         self.logger.debug('HomeURL: {}'.format(self.url))
         self.driver.get(self.url)
@@ -127,6 +225,68 @@ class HomePage(BasePage):
             input('Press ENTER here after you have manually signed in ')
         return self
 
+    def cookies(self):
+        """ cookies of the signed-in session, to share with other browsers """
+        return self.driver.get_cookies()
+
+    def user_agent(self):
+        """ user agent of the browser, to send along with its cookies """
+        return self.driver.execute_script('return navigator.userAgent')
+
+    def saved_login(self):
+        """ last login, with only unexpired cookies, None if none left """
+        try:
+            with open(self.login_file, 'r') as login_file:
+                saved = json.load(login_file)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        saved['cookies'] = [cookie for cookie in saved.get('cookies', [])
+                            if cookie.get('expiry', now + 1) > now]
+        return saved if saved['cookies'] else None
+
+    def save_login(self):
+        """ keep the cookies of this login for the next run """
+        os.makedirs(CACHEDIR, exist_ok=True)   # store in sub-directory
+        # Anyone who can read them can sign in as us
+        fd = os.open(self.login_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                     0o600)
+        os.fchmod(fd, 0o600)      # the mode above is only for a new file
+        with os.fdopen(fd, 'w') as login_file:
+            json.dump({'saved': time.time(),
+                       'user_agent': self.user_agent(),
+                       'cookies': self.cookies()}, login_file)
+        return self
+
+    def probe(self, cookies, user_agent=None):
+        """ True if these cookies still get the home page signed in """
+        # A plain request, without the browser, is enough to tell
+        headers = {'User-Agent': user_agent} if user_agent else {}
+        try:
+            res = requests.get(self.url, cookies=cookie_jar(cookies),
+                               headers=headers, timeout=PROBE_TIMEOUT)
+        except requests.RequestException as e:
+            self.logger.info('Login probe failed: {}'.format(e))
+            return False
+        signed_in = res.ok and not SIGNIN.search(res.text)
+        self.logger.debug('Login probe {}: {}'.format(res.status_code,
+                                                      signed_in))
+        return signed_in
+
+    def share_login(self, cookies):
+        """ sign in by taking the cookies of a browser already signed in """
+        self.driver.get(self.url)
+        for cookie in cookies:
+            try:
+                self.driver.add_cookie(cookie)
+            except WebDriverException:
+                # Cookies of other sites, such as the sign-in server,
+                # can only be set from there and are not needed here
+                self.logger.debug('Skipped cookie {} for {}'.format(
+                    cookie.get('name'), cookie.get('domain')))
+        self.driver.get(self.url)
+        return self
+
 
 EDIT_ID = 'MainCopy_ctl04_ucPermission_ManageDropDown1_lnkbtnEdit'
 TITLE_ID = 'PageTitleH1'
@@ -167,15 +327,12 @@ class PostPage(BasePage):
         return self
 
     def author(self):
-        if self.soup == '':
-            self.soup = BeautifulSoup(self.content, PARSER)
-        post = self.soup
-
-        # Older posts use meta tag description, newer posts use byline
-        desc = post.find('meta', attrs={'name': 'description'})
-        byline_id = 'MainCopy_ctl04_ucPermission_UserName_lnkProfile'
-        byline = post.find('a', attrs={'id': byline_id})
-        return desc, byline
+        """ author line from meta description (older) or byline (newer) """
+        content = self.content
+        if isinstance(content, str):
+            content = content.encode(encoding='utf-8')
+        record = extract(content)
+        return record.postedby
 
     def editpost(self):
         browser = self.driver
@@ -202,8 +359,8 @@ class PostPage(BasePage):
         return self
 
     def permalink_from_file(self, postname):
-        post = BeautifulSoup(open(postname), PARSER)
-        self.permalink_from_source(post)
+        record = extract(read_doc(postname))
+        self.url = record.permalink
         return self
 
 
@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+# pipeline.py -- From frames to reclassify.txt with every stage running
+#
+# scanframes.py, getposts.py and chktopic.py each have to finish before
+# the next can start.  This runs all three at once, joined by bounded
+# queues: post links are fetched while frames are still being scanned,
+# and each post is classified as soon as it lands.  When a queue is full
+# the stage feeding it waits, so no stage runs far ahead of the next.
+#
+#    scan frames  -->  links  -->  fetch posts (threads)  -->  posts  -->
+#    classify
+#
+# The same files come out as from running the three programs in turn:
+# postlist.txt, permalink.txt, posts/ and reclassify.txt, and the same
+# caches and manifests are used and kept up to date.
+#
+# Usage:
+#       ./pipeline.py                 Scan, fetch and classify everything
+#       ./pipeline.py --workers 16    Fetch 16 posts at once, default 8
+#       ./pipeline.py --queue 100     Up to 100 items waiting between
+#                                     stages, default 40
+#
+import os
+import queue
+import sys
+import threading
+import chktopic
+import getposts
+import scanframes
+from constants import CACHEDIR, FRAMESDIR, POSTSDIR
+from docArchive import list_docs
+from frameManifest import FrameManifest
+from functions import get_modname, get_option, setup_logging
+from httpSession import make_session
+from postStore import PostStore, load_post
+from showProgress import showProgress
+
+QUEUE_SIZE = 40
+WAIT = 0.5          # seconds between looks at the stop flag
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    parms = {'workers': max(get_option(argv, '--workers',
+                                       getposts.WORKERS), 1),
+             'queue': max(get_option(argv, '--queue', QUEUE_SIZE), 1),
+             }
+    return modname, parms
+
+
+class Pipeline():
+    """ Scan, fetch and classify stages joined by bounded queues """
+
+    def __init__(self, workers, size=QUEUE_SIZE):
+        self.workers = workers
+        self.links = queue.Queue(size)
+        self.landed = queue.Queue(size)
+        self.lock = threading.Lock()
+        self.stop = threading.Event()    # set when a stage has failed
+        self.posts = {}          # post key to (topic, postlink)
+        self.fetched = getposts.read_manifest()
+        self.session = make_session(workers)
+        self.manifest = None
+        self.failed = 0
+        return None
+
+    def scan(self):
+        """ Stage 1: post links from each frame, in frame order """
+        allnames = list_docs(FRAMESDIR)
+        manifest = FrameManifest()
+        try:
+            with open('postlist.txt', 'w') as out_file:
+                for framename in allnames:
+                    if self.stop.is_set():
+                        return None     # keep what the manifest knows
+                    self.scan_frame(framename, manifest, out_file)
+            manifest.forget(allnames)
+        finally:
+            manifest.close()
+            for worker in range(self.workers):
+                self.put(self.links, None)
+        return None
+
+    def scan_frame(self, framename, manifest, out_file):
+        """ Queue the posts of one frame that are not fetched yet """
+        if not manifest.is_current(framename):
+            manifest.put(*scanframes.scan_frame(framename))
+        topic = scanframes.frame_topic(framename)
+        for postlink in scanframes.post_links(topic,
+                                              manifest.get(framename)):
+            print(topic, postlink, file=out_file)
+            key = getposts.post_key(postlink)
+            if key in self.posts:
+                continue
+            self.posts[key] = topic, postlink
+            if key not in self.fetched:
+                self.put(self.links, key)    # waits while the queue is full
+        return None
+
+    def put(self, stage, item):
+        """ Queue item, waiting while full, unless the run is stopped """
+        while not self.stop.is_set():
+            try:
+                stage.put(item, timeout=WAIT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch(self):
+        """ Stage 2: fetch posts, pass on the ones that are ours """
+        while not self.stop.is_set():
+            try:
+                key = self.links.get(timeout=WAIT)
+            except queue.Empty:
+                continue
+            if key is None:
+                self.put(self.landed, None)
+                return None
+            topic, postlink = self.posts[key]
+            try:
+                result = getposts.follow(postlink, topic, self.session)
+            except Exception as exc:    # one bad post must not stop us
+                # Not in the manifest, so the next run tries it again
+                getposts.logger.error('Failed: {} {}'.format(postlink, exc))
+                with self.lock:
+                    self.failed += 1
+                continue
+            with self.lock:
+                self.fetched[key] = result
+                getposts.add_manifest(self.manifest, key, result)
+            if result:
+                self.put(self.landed, result[2])     # waits while full
+        return None
+
+    def run(self, classify):
+        """ Run every stage, calling classify on each post as it lands """
+        os.makedirs(POSTSDIR, exist_ok=True)
+        os.makedirs(CACHEDIR, exist_ok=True)
+        self.manifest = getposts.open_manifest()
+        threads = [threading.Thread(target=self.scan)]
+        threads += [threading.Thread(target=self.fetch)
+                    for worker in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        # Stage 3, here: every fetch thread sends None when it is done.
+        # If classify fails, the other stages are told to stop, so they
+        # do not wait forever on queues no one empties.
+        try:
+            running = self.workers
+            while running:
+                postname = self.landed.get()
+                if postname is None:
+                    running -= 1
+                else:
+                    classify(postname)
+        finally:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+            self.manifest.close()
+            self.session.close()
+
+        with open('permalink.txt', 'w') as perm_file:
+            for key in self.posts:
+                if self.fetched.get(key):
+                    topic, permalink, postname = self.fetched[key]
+                    print(topic, permalink, file=perm_file)
+        return None
+
+
+if __name__ == "__main__":
+    modname, parms = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+    for stage in (scanframes, getposts, chktopic):
+        setup_logging(stage.__name__, modname)
+
+    store = PostStore()
+    cache = chktopic.open_cache()
+    results = {}
+    dot = showProgress()
+
+    def classify(postname, extract=True):
+        """ Score one post, from the result cache if it has not changed """
+        dot.show()
+        if extract:
+            store.put(*load_post(postname))
+        key = chktopic.cache_key(store, postname)
+        result = cache.get(key)
+        if result is None:
+            result = chktopic.parse(postname, store.get(postname))
+            cache.put(key, result)
+        results[postname] = result
+        return None
+
+    pipeline = Pipeline(parms['workers'], parms['queue'])
+    pipeline.run(classify)
+    new = len(results)
+
+    # Posts fetched on earlier runs are classified too, as chktopic does
+    postnames = [postname for postname in list_docs(POSTSDIR)
+                 if os.path.basename(postname).startswith('20')]
+    store.update(postnames)
+    for postname in postnames:
+        if postname not in results:
+            classify(postname, extract=False)
+    dot.end()
+    store.close()
+    posts = chktopic.write_results(postnames, results)
+    cache.close()
+
+    print('Links:', len(pipeline.posts), 'New posts:', new,
+          'Failed:', pipeline.failed)
+    logger.info('Links: {} New posts: {} Posts: {} Failed: {}'.format(
+        len(pipeline.posts), new, len(postnames), pipeline.failed))
+    for topic, count in posts.items():
+        logger.info('Topic {}: {} posts'.format(topic, count))
+
+    print("Done.")
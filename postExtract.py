@@ -0,0 +1,173 @@
+# postExtract.py -- Pull only the parts of a post that the tools use
+#
+# Building a full BeautifulSoup tree of every post is slow and holds the
+# whole document in memory.  This streams through the HTML with lxml's
+# incremental parser, keeps just the title, body paragraphs, author line,
+# permalink and links, and throws away everything else as it goes.
+#
+#    from postExtract import extract
+#    record = extract(postname)           # file name, bytes or file object
+#    print(record.title, record.blogger, record.permalink)
+#
+import io
+import os
+import re
+import sys
+from collections import namedtuple
+from lxml import etree
+
+POSTEDbyRegex = re.compile(r'posted by: (.*)$')
+BYLINE_ID = 'MainCopy_ctl04_ucPermission_UserName_lnkProfile'
+BODY_TAGS = ('p', 'table', 'dl')
+
+# Elements whose text is read when they end, so their children
+# must be kept around until then
+HOLD_TAGS = ('p', 'table', 'dl', 'h3', 'a')
+
+PostRecord = namedtuple('PostRecord', ['title', 'contents', 'postedby',
+                                       'blogger', 'permalink', 'links'])
+
+TEXTpath = etree.XPath('.//text()[not(parent::script or parent::style)]')
+
+
+def _text(elem):
+    """ text of an element and its children, like BeautifulSoup .text """
+    return ''.join(TEXTpath(elem))
+
+
+def _classes(elem):
+    """ list of CSS classes on an element """
+    return elem.get('class', '').split()
+
+
+def extract(source, encoding='utf-8'):
+    """ Stream through a post and return its PostRecord """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    title = None
+    desc = None
+    byline = None
+    permalink = ''
+    links = []
+
+    # Body text is collected in document order from inside col-md-12
+    # divs.  Only the outermost p, table or dl is kept, so a paragraph
+    # inside a table, or a nested div, is not counted twice.
+    contents = []
+    in_body = 0
+    outer = None
+    in_permalink = 0
+    holding = 0
+
+    events = etree.iterparse(source, events=('start', 'end'), html=True,
+                             encoding=encoding, remove_comments=True)
+    for event, elem in events:
+        tag = elem.tag
+        if event == 'start':
+            if tag in HOLD_TAGS:
+                holding += 1
+            if tag in BODY_TAGS:
+                if in_body and outer is None:
+                    outer = elem
+            elif tag == 'div':
+                classes = _classes(elem)
+                if 'col-md-12' in classes:
+                    in_body += 1
+                if 'permalink-block' in classes or in_permalink:
+                    in_permalink += 1
+            elif tag == 'input' and in_permalink and not permalink:
+                permalink = elem.get('value', '')
+            elif tag == 'meta' and desc is None:
+                if elem.get('name') == 'description':
+                    desc = elem.get('content', '')
+            continue
+
+        # event == 'end'
+        if tag in BODY_TAGS:
+            if elem is outer:
+                contents.append(_text(elem))
+                outer = None
+        elif tag == 'div':
+            if 'col-md-12' in _classes(elem):
+                in_body -= 1
+            if in_permalink:
+                in_permalink -= 1
+        elif tag == 'h3' and title is None:
+            if 'blogTitle' in _classes(elem):
+                title = _text(elem).replace('</h3>', '')
+        elif tag == 'a':
+            href = elem.get('href')
+            if href is not None:
+                links.append(href)
+            if byline is None and elem.get('id') == BYLINE_ID:
+                byline = _text(elem)
+
+        if tag in HOLD_TAGS:
+            holding -= 1
+        if not holding:
+            # Nothing above still needs this element, free it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    # Older posts use meta tag description, newer posts use byline
+    postedby = ''
+    blogger = ''
+    if desc is not None:
+        postedby = desc.split('\n')[0]
+        mo = POSTEDbyRegex.search(postedby)
+        if mo:
+            blogger = mo.group(1)
+    elif byline is not None:
+        postedby = byline
+        blogger = byline
+
+    # One join for the whole body, rather than adding piece by piece
+    body = ''.join(' ' + text for text in contents)
+    return PostRecord(title or '', body, postedby, blogger, permalink, links)
+
+
+if __name__ == "__main__":
+    print('Testing: ', sys.argv[0])
+
+    post = b'''<html><head>
+<meta name="description" content="posted by: Tony Pearson
+Storage blog">
+<script>var x = "<p>not me</p>";</script></head><body>
+<a href="#top">skip</a>
+<h3 class="blogTitle">Tape &amp; Flash</h3>
+<div class="col-md-12 blog">
+<p>First <b>para</b></p>
+<table><tr><td>cell</td></tr></table>
+<p>Second <a href="http://example.com/">link</a></p>
+<dl><dt>term</dt></dl>
+</div>
+<div class="permalink-block"><input type="text" value="http://x/y"></div>
+</body></html>'''
+    record = extract(post)
+    print(record)
+    assert record.title == 'Tape & Flash'
+    assert record.contents == ' First para cell Second link term'
+    assert record.blogger == 'Tony Pearson'
+    assert record.permalink == 'http://x/y'
+    assert record.links == ['#top', 'http://example.com/']
+
+    # Regression fixture: nested paragraphs and divs are only read once,
+    # and the topic scores stay where they were before the rewrite
+    from chktopic import MATCHER
+    fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'fixtures', '2020-07-01-fla00001-fixture-post.html')
+    record = extract(fixture)
+    for phrase in ('Spectrum Virtualize', 'Replication over', 'NAND'):
+        assert record.contents.count(phrase) == 1, phrase
+    assert 'navigation boilerplate' not in record.contents
+    assert 'menu' not in record.contents
+    assert record.blogger == 'Tony Pearson'
+    counts, title_hits, body_hits = MATCHER.score(record.title,
+                                                  record.contents)
+    print(counts)
+    assert counts == {'dpr': 0, 'fla': 16, 'fob': 0, 'mfr': 1,
+                      'san': 2, 'smr': 0, 'tap': 0}
+
+    print('Congratulations')
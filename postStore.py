@@ -0,0 +1,146 @@
+# postStore.py -- Extracted post metadata shared by all the tools
+#
+# chktopic.py, chklinks.py and the other tools all need the same few
+# things from each post: title, author, permalink, body text and links.
+# Rather than each of them parsing 1,100 HTML files on every run, the
+# extracted PostRecord of each post is kept in a SQLite table, keyed by
+# file name and checked against the file's modification time.
+#
+#    from postStore import PostStore
+#    store = PostStore()
+#    store.update(postnames)          # extract only new or changed posts
+#    record = store.get(postname)
+#
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from constants import CACHEDIR
+from docArchive import doc_exists, doc_mtime, read_doc
+from postExtract import PostRecord, extract
+
+STORENAME = 'posts.db'
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS posts (
+                postname TEXT PRIMARY KEY,
+                mtime REAL,
+                digest TEXT,
+                title TEXT,
+                contents TEXT,
+                postedby TEXT,
+                blogger TEXT,
+                permalink TEXT,
+                links TEXT)"""
+
+
+def load_post(postname):
+    """ Read and extract one post, return its mtime, digest and record """
+    mtime = doc_mtime(postname)
+    content = read_doc(postname)
+    digest = hashlib.sha256(content).hexdigest()
+    return postname, mtime, digest, extract(content)
+
+
+class PostStore():
+    """ SQLite table of PostRecords, one row per post file """
+
+    def __init__(self, filename=STORENAME):
+        """ Open or create the store in CACHEDIR """
+        os.makedirs(CACHEDIR, exist_ok=True)   # store in sub-directory
+        self.filename = os.path.join(CACHEDIR, filename)
+        self.db = sqlite3.connect(self.filename)
+        self.db.execute(SCHEMA)
+        return None
+
+    def _row(self, postname):
+        return self.db.execute('SELECT * FROM posts WHERE postname = ?',
+                               (postname,)).fetchone()
+
+    def is_current(self, postname):
+        """ True if the stored row matches the file on disk """
+        row = self.db.execute('SELECT mtime FROM posts WHERE postname = ?',
+                              (postname,)).fetchone()
+        return row is not None and row[0] == doc_mtime(postname)
+
+    def get(self, postname):
+        """ Stored PostRecord for this post, or None """
+        row = self._row(postname)
+        if row is None:
+            return None
+        title, contents, postedby, blogger, permalink, links = row[3:]
+        return PostRecord(title, contents, postedby, blogger, permalink,
+                          json.loads(links))
+
+    def digest(self, postname):
+        """ SHA-256 of the post contents when it was last extracted """
+        row = self.db.execute('SELECT digest FROM posts WHERE postname = ?',
+                              (postname,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, postname, mtime, digest, record):
+        """ Store the extracted record of a post """
+        self.db.execute('INSERT OR REPLACE INTO posts VALUES '
+                        '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (postname, mtime, digest, record.title,
+                         record.contents, record.postedby, record.blogger,
+                         record.permalink, json.dumps(record.links)))
+        return self
+
+    def update(self, postnames, mapper=map):
+        """
+        Extract posts that are new or changed, and forget deleted ones
+
+        mapper can be the map method of a process pool, to extract the
+        posts in parallel.  Returns the number of posts extracted.
+        """
+        stale = [name for name in postnames if not self.is_current(name)]
+        for loaded in mapper(load_post, stale):
+            self.put(*loaded)
+
+        known = set(postnames)
+        rows = self.db.execute('SELECT postname FROM posts').fetchall()
+        for (postname,) in rows:
+            if postname not in known and not doc_exists(postname):
+                self.db.execute('DELETE FROM posts WHERE postname = ?',
+                                (postname,))
+        self.db.commit()
+        return len(stale)
+
+    def close(self):
+        """ Save and close the store """
+        self.db.commit()
+        self.db.close()
+        return None
+
+
+if __name__ == "__main__":
+    import tempfile
+    print('Testing: ', sys.argv[0])
+
+    post = os.path.join(tempfile.mkdtemp(), '2020-07-01-fla00001-test.html')
+    with open(post, 'w') as file_obj:
+        file_obj.write('<h3 class="blogTitle">Tape</h3>'
+                       '<div class="col-md-12"><p>LTO <a href="/x">x</a>'
+                       '</p></div>')
+    store = PostStore('test_posts.db')
+    assert store.update([post]) == 1
+    assert store.update([post]) == 0
+    record = store.get(post)
+    print(record)
+    assert record.title == 'Tape' and record.links == ['/x']
+
+    # A changed file is extracted again
+    with open(post, 'a') as file_obj:
+        file_obj.write('<h3 class="blogTitle">ignored</h3>')
+    os.utime(post, (0, 0))
+    assert store.update([post]) == 1
+
+    # A deleted file is forgotten
+    os.unlink(post)
+    store.update([])
+    assert store.get(post) is None
+    store.close()
+    os.unlink(store.filename)
+
+    print('Congratulations')
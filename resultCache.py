@@ -0,0 +1,138 @@
+# resultCache.py -- Remember classification results between runs
+#
+# Almost none of the posts change between runs of chktopic.py, so the
+# results of each post are kept in a small SQLite database, keyed by a
+# hash of the file contents.  Every entry also carries a fingerprint of
+# the topic pattern table; if the table changes, the old entries no longer
+# match and are dropped when the cache is opened.
+#
+#    from resultCache import ResultCache, file_digest, fingerprint
+#    cache = ResultCache('chktopic.db', fingerprint(TOPICS))
+#    result = cache.get(file_digest(postname))
+#
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from constants import CACHEDIR
+
+MAX_ENTRIES = 5000
+CACHE_VERSION = '1'
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS results (
+                digest TEXT PRIMARY KEY,
+                fingerprint TEXT,
+                result TEXT,
+                used REAL)"""
+
+
+def file_digest(filename):
+    """ SHA-256 hash of the contents of a file """
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(65536), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def fingerprint(topics, *extra):
+    """ hash of a topic pattern table, plus anything else results use """
+    sha = hashlib.sha256(CACHE_VERSION.encode())
+    for topic, patterns in topics.items():
+        sha.update(topic.encode())
+        for pattern in patterns:
+            sha.update('\0{}\0{}'.format(pattern.pattern,
+                                         pattern.flags).encode())
+    for item in extra:
+        sha.update('\0{}'.format(item).encode())
+    return sha.hexdigest()
+
+
+class ResultCache():
+    """
+    Persistent cache of per-post results, with least-recently-used eviction
+
+    Results are any JSON-friendly value.  Entries made with a different
+    fingerprint are removed when the cache is opened, and once more than
+    max_entries are stored the ones used longest ago are removed on close.
+    """
+
+    def __init__(self, filename, fingerprint, max_entries=MAX_ENTRIES):
+        """ Open or create the cache database in CACHEDIR """
+        os.makedirs(CACHEDIR, exist_ok=True)   # store in sub-directory
+        self.filename = os.path.join(CACHEDIR, filename)
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(self.filename)
+        self.db.execute(SCHEMA)
+        self.db.execute('DELETE FROM results WHERE fingerprint != ?',
+                        (fingerprint,))
+        self.db.commit()
+        return None
+
+    def get(self, digest):
+        """ Return the stored result for this digest, or None """
+        row = self.db.execute('SELECT result FROM results WHERE digest = ?',
+                              (digest,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute('UPDATE results SET used = ? WHERE digest = ?',
+                        (time.time(), digest))
+        return json.loads(row[0])
+
+    def put(self, digest, result):
+        """ Store a result for this digest """
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                        (digest, self.fingerprint, json.dumps(result),
+                         time.time()))
+        return self
+
+    def evict(self):
+        """ Remove least recently used entries beyond max_entries """
+        self.db.execute("""DELETE FROM results WHERE digest IN (
+                               SELECT digest FROM results
+                               ORDER BY used DESC LIMIT -1 OFFSET ?)""",
+                        (self.max_entries,))
+        return self
+
+    def close(self):
+        """ Evict, save and close the cache """
+        self.evict()
+        self.db.commit()
+        self.db.close()
+        return None
+
+
+if __name__ == "__main__":
+    import re
+    print('Testing: ', sys.argv[0])
+
+    topics = {'tap': [re.compile(r'\W[tT]ape')]}
+    cache = ResultCache('test_cache.db', fingerprint(topics), max_entries=2)
+    for n in range(3):
+        cache.put('digest{}'.format(n), {'counts': {'tap': n}})
+        time.sleep(0.01)
+    assert cache.get('digest2') == {'counts': {'tap': 2}}
+    assert cache.get('missing') is None
+    cache.close()
+
+    # Oldest entry evicted, newest still there
+    cache = ResultCache('test_cache.db', fingerprint(topics), max_entries=2)
+    assert cache.get('digest0') is None
+    assert cache.get('digest2') == {'counts': {'tap': 2}}
+    cache.close()
+
+    # Any change to the pattern table invalidates every entry
+    topics['tap'].append(re.compile(r'LTO'))
+    cache = ResultCache('test_cache.db', fingerprint(topics))
+    assert cache.get('digest2') is None
+    cache.close()
+    os.unlink(cache.filename)
+
+    print('Congratulations')
@@ -9,15 +9,31 @@
 #       ./getposts.py               This option will delete all previous posts
 #       ./getposts.py fla           Process fla00001 to fla99999 frames
 #       ./getposts.py fla00007      Process just the flash007 frame
+#       ./scanframes.py --workers 4 Read the frames in 4 processes
+#       ./scanframes.py --nocache   Read every frame, even if unchanged
+#
+# Only the BlogTitle anchors of each frame are needed, so they are found
+# with one XPath query rather than a full BeautifulSoup tree.  With
+# --workers the frames are read in parallel, but their links are still
+# checked and written one frame at a time, in frame order, so the
+# LASTDATE check sees them exactly as before.
+#
+# The links of every frame are kept in a manifest, see frameManifest.py.
+# Only new or changed frames are read, and postlist.txt is rebuilt from
+# the manifest, so a run after a small getframes.py update is quick.
 
+import logging
 import os
 import re
 import requests
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
 from selenium import webdriver
-from bs4 import BeautifulSoup
-from functions import get_modname, setup_logging
-from pageClass import HomePage, PostPage, FRAMESDIR, POSTSDIR, PARSER
+from docArchive import doc_mtime, list_docs, read_doc
+from frameManifest import FrameManifest, frame_digest
+from functions import get_modname, get_option, setup_logging
+from pageClass import HomePage, PostPage, FRAMESDIR, POSTSDIR
 from showProgress import showProgress
 
 
@@ -27,32 +43,57 @@ DATEregex = re.compile(r'/(20\d\d/[01]\d/[0-3]\d)/')
 FRAME_DATE = 'Last date for {} is {}'
 FRAME_SEQ = 'Blog {} after Topic {} Last Date {}'
 BLOGLINK = 'tony-pearson1'
+BLOGTITLE = etree.XPath('//a[contains(concat(" ", normalize-space(@class),'
+                        ' " "), " BlogTitle ")]/@href')
+logger = logging.getLogger(__name__)
 
 def get_parms(argv):
     modname = get_modname(argv)
+    workers = max(get_option(argv, '--workers', 1), 1)
 
     # Allow individual keyword that can match the frames file
     # Examples:  flash (all flashNNN) or flash007 (just this frame)
-    if len(argv) > 1:
-        keyw = argv[1]
-    else:
-        keyw = '.'   # matches all files
-    return modname, keyw
+    keyw = '.'   # matches all files
+    args = argv[1:]
+    for pos, arg in enumerate(args):
+        if not arg.startswith('--') and not (pos and
+                                             args[pos - 1] == '--workers'):
+            keyw = arg
+            break
+    return modname, keyw, workers, '--nocache' not in argv
 
-def parse(framename):
-    """ Parse the frame to extract all post links """
-    topic = re.sub(r'.*/(\w*).html', r'\1', framename)
-    print(topic, end='')
-    logger.info('Topic={} Name={}'.format(topic,framename))
-    soup = BeautifulSoup(open(framename), PARSER)
-    links = soup.findAll('a', attrs={'class': 'BlogTitle'})
 
-    # A frame can list up to 20 blog posts
-    dot = showProgress()
-    for link in links:
-        postlink = link['href']
+def links_in(content):
+    """ href of every BlogTitle anchor in a frame, in page order """
+    tree = etree.fromstring(content, etree.HTMLParser())
+    if tree is None:
+        return []
+    return [str(href) for href in BLOGTITLE(tree)]
+
+
+def frame_links(framename):
+    """ href of every BlogTitle anchor in the frame file """
+    return links_in(read_doc(framename))
+
+
+def scan_frame(framename):
+    """ Read one frame, return its mtime, digest and links """
+    mtime = doc_mtime(framename)
+    content = read_doc(framename)
+    return framename, mtime, frame_digest(content), links_in(content)
+
+
+def frame_topic(framename):
+    """ topic of the frame, taken from its file name """
+    return re.sub(r'.*/(\w*).html', r'\1', framename)
+
+
+def post_links(topic, links, dot=None):
+    """ Links to the blogger's posts that pass the LASTDATE check """
+    for postlink in links:
         # import pdb; pdb.set_trace()
-        dot.show()
+        if dot:
+            dot.show()
         if BLOGLINK not in postlink:
             logger.info('Ignoring: {}'.format(postlink))
             continue
@@ -67,23 +108,58 @@ def parse(framename):
                 warn_seq = FRAME_SEQ.format(blogdate, topic, LASTDATE[topic])
                 logger.warning(warn_seq)
                 continue
-            print(topic, postlink, file=out_file)
+            yield postlink
+    return None
+
+
+def parse(framename, links=None):
+    """ Parse the frame to extract all post links """
+    topic = frame_topic(framename)
+    print(topic, end='')
+    logger.info('Topic={} Name={}'.format(topic,framename))
+    if links is None:
+        links = frame_links(framename)
+
+    # A frame can list up to 20 blog posts
+    dot = showProgress()
+    for postlink in post_links(topic, links, dot):
+        print(topic, postlink, file=out_file)
     dot.end()
     return None
 
 
 if __name__ == "__main__":
-    modname, keyw = get_parms(sys.argv)
+    modname, keyw, workers, use_cache = get_parms(sys.argv)
     logger = setup_logging(__name__, modname)
 
+    # Only process HTML files in this directory
+    allnames = list_docs(FRAMESDIR)
+    framenames = [framename for framename in allnames
+                  if keyw < os.path.basename(framename)]
+    pool = None
+    mapper = map
+    if workers > 1:
+        logger.info('Workers: {}'.format(workers))
+        pool = ProcessPoolExecutor(workers)
+        mapper = pool.map
+
+    # Only frames that are new or changed need reading
+    manifest = FrameManifest()
+    stale = [framename for framename in framenames
+             if not (use_cache and manifest.is_current(framename))]
+    for scanned in mapper(scan_frame, stale):
+        manifest.put(*scanned)
+    manifest.forget(allnames)
+    print('Frames:', len(framenames), 'Scanned:', len(stale))
+    logger.info('Frames: {} Scanned: {}'.format(len(framenames), len(stale)))
+    if pool:
+        pool.shutdown()
+
+    # Links are checked in frame order
     with open('postlist.txt', 'w') as out_file:
-        filenames = sorted(os.listdir(FRAMESDIR))
-        for filename in filenames:
-            # Only process HTML files in this directory
-            if ((keyw < filename)
-                    and filename.endswith('.html')):
-                framename = os.path.join(FRAMESDIR, filename)
-                logger.info('Processing: {}'.format(framename))
-                parse(framename)
+        for framename in framenames:
+            logger.info('Processing: {}'.format(framename))
+            parse(framename, manifest.get(framename))
+    manifest.close()
 
     print('Done')
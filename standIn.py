@@ -0,0 +1,293 @@
+# standIn.py -- Local stand-in web hosts for testing without the internet
+#
+# Link checking and post fetching both talk to hosts all over the
+# internet, so neither can be measured or tested repeatably against the
+# real thing.  This starts local HTTP servers in a separate process, each
+# standing in for one host, that answer after a set latency.  The first
+# part of the path picks the answer:
+#
+#    /ok/...      200
+#    /gone/...    404
+#    /error/...   500
+#    /moved/...   301 to the same path under /ok/
+#
+# A hanging host accepts connections but takes hang seconds to answer,
+# and a dead host refuses connections outright.
+#
+#    from standIn import StandIn
+#    stand_in = StandIn(hosts=4, hanging=1, dead=1, latency=0.05)
+#    urls = [host + 'ok/page' for host in stand_in.hosts]
+#    stand_in.close()
+#
+# FrameReplay stands in for the community site itself, replaying the
+# frames captured in frames/.  A GET of any path with ?communitykey=
+# answers with the first frame of that community, and a postback, a POST
+# with __EVENTTARGET set, with the frame after the one posted from.  The
+# captured frames do not say which page they are, so each one is served
+# with an extra hidden __REPLAYPAGE input that comes back in the post.
+# Without the sign-in cookie, if one is given, it redirects to /login.
+#
+#    replay = FrameReplay(FRAMESDIR, cookie='session')
+#    url = replay.frame_url.format(COMKEYS['fla'])
+#    replay.close()
+#
+import collections
+import multiprocessing
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+LATENCY = 0.05      # seconds before each answer
+HANG = 60           # seconds a hanging host takes to answer
+ANSWERS = {'ok': 200, 'gone': 404, 'error': 500, 'moved': 301}
+PAGE = b'<html><body><p>Stand-in page</p></body></html>\n'
+FRAMEPATH = ('recent-community-blogs'
+             '?communitykey={}&tab=recentcommunityblogsdashboard')
+COMMUNITYKEY = re.compile(rb'<form[^>]*communitykey=([-0-9a-f]+)')
+FORMTAG = re.compile(rb'<form[^>]*>')
+
+
+class Handler(BaseHTTPRequestHandler):
+    """ Answer by the first part of the path, after a delay """
+
+    protocol_version = 'HTTP/1.1'     # keep connections alive
+    latency = LATENCY
+
+    def do_HEAD(self):
+        self.answer()
+
+    def do_GET(self):
+        self.answer()
+
+    def answer(self):
+        time.sleep(self.latency)
+        kind, sep, rest = self.path[1:].partition('/')
+        code = ANSWERS.get(kind, 404)
+        self.send_response(code)
+        if code == 301:
+            self.send_header('Location', '/ok/' + rest)
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        if self.command == 'GET':
+            self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    """ Clients that give up on a hanging host are not an error """
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def free_port():
+    """ A local port with nothing listening on it """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(conn, hosts, hanging, latency, hang):
+    """ Run the stand-in servers until told to stop over conn """
+    servers = []
+    for number in range(hosts):
+        delay = hang if number < hanging else latency
+        handler = type('Handler', (Handler,), {'latency': delay})
+        server = QuietServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    conn.send([server.server_port for server in servers])
+    conn.recv()
+    for server in servers:
+        server.shutdown()
+    return None
+
+
+def community_frames(directory):
+    """ Captured frames of each community key, in page order """
+    from docArchive import list_docs, read_doc
+    frames = collections.defaultdict(list)
+    for framename in list_docs(directory):
+        content = read_doc(framename)
+        match = COMMUNITYKEY.search(content)
+        if match:
+            frames[match.group(1).decode()].append(content)
+    return dict(frames)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """ Answer with captured frames, the next one on each postback """
+
+    protocol_version = 'HTTP/1.1'
+    frames = {}
+    cookie = None
+
+    def do_GET(self):
+        self.answer({})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        self.answer(parse_qs(body, keep_blank_values=True))
+
+    def answer(self, form):
+        if self.cookie and self.cookie + '=' not in self.headers.get(
+                'Cookie', ''):
+            self.send_response(302)
+            self.send_header('Location', '/login')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        query = parse_qs(urlsplit(self.path).query)
+        pages = self.frames.get(query.get('communitykey', [''])[0])
+        if not pages:
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+            return None
+        page = 0
+        if form.get('__EVENTTARGET', [''])[0]:
+            page = int(form.get('__REPLAYPAGE', ['0'])[0]) + 1
+        page = min(page, len(pages) - 1)
+        marker = ('<input type="hidden" name="__REPLAYPAGE" value="{}" />'
+                  .format(page)).encode()
+        content = FORMTAG.sub(lambda match: match.group(0) + marker,
+                              pages[page], count=1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_frames(conn, directory, cookie):
+    """ Run the replay server until told to stop over conn """
+    handler = type('ReplayHandler', (ReplayHandler,),
+                   {'frames': community_frames(directory), 'cookie': cookie})
+    server = QuietServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn.send((server.server_port, {key: len(pages) for key, pages
+                                    in handler.frames.items()}))
+    conn.recv()
+    server.shutdown()
+    return None
+
+
+class StandIn():
+    """
+    Stand-in hosts, served from a separate process
+
+    hosts are the base urls of all of them, ending in '/'.  The first
+    hanging of them are also in self.hanging, and the last dead of them,
+    which refuse connections, are also in self.dead.
+    """
+
+    def __init__(self, hosts=4, hanging=0, dead=0, latency=LATENCY,
+                 hang=HANG):
+        live = max(hosts - dead, 0)
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve, args=(child, live, hanging, latency, hang),
+            daemon=True)
+        self.process.start()
+        ports = self.conn.recv()
+        ports += [free_port() for number in range(hosts - live)]
+        self.hosts = ['http://127.0.0.1:{}/'.format(port) for port in ports]
+        self.hanging = self.hosts[:min(hanging, live)]
+        self.dead = self.hosts[live:]
+        return None
+
+    def close(self):
+        """ Stop the servers """
+        self.conn.send(None)
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        return None
+
+
+class FrameReplay(StandIn):
+    """
+    Stand-in community site, replaying the frames in a directory
+
+    url is its base url, ending in '/', and frame_url the url of the
+    first frame of a community, to format with its key.  pages has the
+    number of frames of each community key.
+    """
+
+    def __init__(self, directory, cookie=None):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve_frames, args=(child, directory, cookie),
+            daemon=True)
+        self.process.start()
+        port, self.pages = self.conn.recv()
+        self.url = 'http://127.0.0.1:{}/'.format(port)
+        self.frame_url = self.url + FRAMEPATH
+        return None
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import requests
+    print('Testing: ', sys.argv[0])
+
+    stand_in = StandIn(hosts=3, hanging=1, dead=1, latency=0.01, hang=1)
+    slow, ok, dead = stand_in.hosts
+    assert stand_in.hanging == [slow] and stand_in.dead == [dead]
+    assert requests.get(ok + 'ok/a?b=1').status_code == 200
+    assert requests.head(ok + 'gone/a').status_code == 404
+    assert requests.get(ok + 'error/a').status_code == 500
+    res = requests.get(ok + 'moved/a/b')
+    assert res.status_code == 200 and res.url == ok + 'ok/a/b'
+    assert res.content == PAGE
+    try:
+        requests.get(slow + 'ok/a', timeout=0.2)
+        assert False, 'hanging host answered'
+    except requests.Timeout:
+        pass
+    try:
+        requests.get(dead + 'ok/a', timeout=0.2)
+        assert False, 'dead host answered'
+    except requests.ConnectionError:
+        pass
+    stand_in.close()
+
+    # Replayed frames page forward on each postback, up to the last
+    directory = tempfile.mkdtemp()
+    form = ('<html><form method="post" action="./recent-community-blogs?'
+            'communitykey=abc-1&amp;tab=x" id="MasterPageForm"><p>{}</p>'
+            '</form></html>')
+    for number in range(3):
+        with open(os.path.join(directory, 'abc{}.html'.format(number)),
+                  'w') as file_obj:
+            file_obj.write(form.format(number))
+    replay = FrameReplay(directory, cookie='session')
+    assert replay.pages == {'abc-1': 3}
+    url = replay.frame_url.format('abc-1')
+    assert requests.get(url, allow_redirects=False).status_code == 302
+    with requests.Session() as session:
+        session.cookies.set('session', 'x')
+        assert '<p>0</p>' in session.get(url).text
+        assert session.get(replay.frame_url.format('x')).status_code == 404
+        for posted, number in ((0, 1), (1, 2), (2, 2)):
+            res = session.post(url, data={'__EVENTTARGET': 'next',
+                                          '__REPLAYPAGE': posted})
+            assert '<p>{}</p>'.format(number) in res.text
+    replay.close()
+
+    print('Congratulations')
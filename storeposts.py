@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+# storeposts.py -- Extract all posts into the shared metadata store
+#
+# Reads every post in the posts directory once and saves its title,
+# author, permalink, body text and links, so that chktopic.py, chklinks.py
+# and the other tools can read them without parsing the HTML again.
+# Posts already in the store are skipped unless the file has changed.
+#
+# Usage:
+#       ./storeposts.py               Extract new or changed posts
+#       ./storeposts.py --workers 4   Spread the extraction across 4 processes
+#
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from constants import POSTSDIR
+from docArchive import list_docs
+from functions import get_modname, get_option, setup_logging
+from postStore import PostStore
+
+
+def get_parms(argv):
+    """ get parameters passed in from command line """
+    modname = get_modname(argv)
+    workers = max(get_option(argv, '--workers', 1), 1)
+    return modname, workers
+
+
+if __name__ == "__main__":
+    modname, workers = get_parms(sys.argv)
+    logger = setup_logging(__name__, modname)
+
+    postnames = list_docs(POSTSDIR)
+
+    store = PostStore()
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            extracted = store.update(postnames, pool.map)
+    else:
+        extracted = store.update(postnames)
+    store.close()
+
+    logger.info('Posts: {} Extracted: {}'.format(len(postnames), extracted))
+    print('Posts:', len(postnames), 'Extracted:', extracted)
+    print('Done.')
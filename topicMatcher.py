@@ -0,0 +1,178 @@
+# topicMatcher.py -- Match all topic patterns against a text in one pass
+#
+# Running each pattern of chktopic.TOPICS separately means over 200 full
+# scans of every post.  Instead, the longest literal that every match of a
+# pattern must contain is pulled out of each regex, and all of these
+# literals are found in a single scan of the text.  Only the patterns whose
+# literal is present are then confirmed with their own regex, starting
+# just before the first place the literal was seen.
+#
+#    from topicMatcher import TopicMatcher
+#    matcher = TopicMatcher(TOPICS)
+#    counts, title_hits, body_hits = matcher.score(title, body)
+#
+import re
+import sys
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+TITLE_WEIGHT = 3
+BODY_WEIGHT = 1
+
+
+def _literal_anchor(pattern):
+    """ longest literal inside pattern, and most characters before it """
+    if pattern.flags & re.IGNORECASE:
+        return '', None
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+
+    # Collect each run of literal characters, with the widest text the
+    # items in front of it can match, or None if that is unbounded
+    runs = []
+    run, prefix, width = '', 0, 0
+    for op, av in list(parsed) + [(None, None)]:
+        if op is sre_parse.LITERAL:
+            if not run:
+                prefix = width
+            run += chr(av)
+            if width is not None:
+                width += 1
+            continue
+        if run:
+            runs.append((run, prefix))
+            run = ''
+        if op is not None and width is not None:
+            item = parsed.__class__(parsed.state, [(op, av)])
+            item_width = item.getwidth()[1]
+            if item_width >= sre_parse.MAXREPEAT:
+                width = None
+            else:
+                width += item_width
+
+    # A bounded prefix lets the confirming search start right before
+    # the literal, so prefer those runs over a longer unbounded one
+    bounded = [r for r in runs if r[1] is not None]
+    if bounded:
+        return max(bounded, key=lambda r: len(r[0]))
+    if runs:
+        return max(runs, key=lambda r: len(r[0]))
+    return '', None
+
+
+class TopicMatcher():
+    """
+    Compiled matcher for a table of topic patterns
+
+    topics is a dictionary of topic name to a list of compiled patterns,
+    the same shape as chktopic.TOPICS.  Every pattern is given an index,
+    in table order, and self.entries[index] is its (topic, pattern) pair.
+    """
+
+    def __init__(self, topics):
+        """ Build the literal scanner from the topic table """
+        self.topics = list(topics)
+        self.entries = []
+        self.anchors = []
+        for topic, patterns in topics.items():
+            for pattern in patterns:
+                self.entries.append((topic, pattern))
+                self.anchors.append(_literal_anchor(pattern))
+
+        # Longest literals first, so that at any position the scanner
+        # reports the longest literal, and every literal that is a
+        # prefix of it is known to be there too
+        literals = sorted({lit for lit, prefix in self.anchors if lit},
+                          key=lambda lit: (-len(lit), lit))
+        self.prefixes = {}
+        for literal in literals:
+            self.prefixes[literal] = [other for other in literals
+                                      if literal.startswith(other)]
+        alternation = '|'.join(re.escape(lit) for lit in literals)
+        self.scanner = re.compile(alternation) if literals else None
+        return None
+
+    def _first_seen(self, text):
+        """ scan text once for the first position of every literal """
+        first = {}
+        if self.scanner is None:
+            return first
+        pos = 0
+        while True:
+            mo = self.scanner.search(text, pos)
+            if mo is None:
+                break
+            start = mo.start()
+            for literal in self.prefixes[mo.group()]:
+                if literal not in first:
+                    first[literal] = start
+            pos = start + 1
+        return first
+
+    def search(self, text):
+        """ first match of every pattern in text, keyed by pattern index """
+        first = self._first_seen(text)
+        hits = {}
+        for index, (topic, pattern) in enumerate(self.entries):
+            literal, prefix = self.anchors[index]
+            if not literal:
+                mo = pattern.search(text)
+            elif literal not in first:
+                continue
+            elif prefix is None:
+                mo = pattern.search(text)
+            else:
+                mo = pattern.search(text, max(0, first[literal] - prefix))
+            if mo:
+                hits[index] = mo
+        return hits
+
+    def score(self, title, body,
+              title_weight=TITLE_WEIGHT, body_weight=BODY_WEIGHT):
+        """ per-topic counts, plus the title and body hits behind them """
+        counts = {}
+        for topic in self.topics:
+            counts[topic] = 0
+        title_hits = self.search(title)
+        body_hits = self.search(body)
+        for index in title_hits:
+            counts[self.entries[index][0]] += title_weight
+        for index in body_hits:
+            counts[self.entries[index][0]] += body_weight
+        return counts, title_hits, body_hits
+
+
+if __name__ == "__main__":
+    print('Testing: ', sys.argv[0])
+
+    topics = {'one': [re.compile(r'[bB]ackup'),
+                      re.compile(r'\WILM'),
+                      re.compile(r'RAM'),
+                      re.compile(r'RAMSan'),
+                      ],
+              'two': [re.compile(r'Spectrum[\s]+Protect'),
+                      re.compile(r'(Storage|Local|Metro)\s+Area\s+Network'),
+                      re.compile(r'[SL]AN\W'),
+                      re.compile(r'\W[tT]ape'),
+                      ],
+              }
+    text = ('Our RAMSan and Backup with ILM, plus tape on a '
+            'Metro  Area Network (SAN) and Spectrum\nProtect backup')
+    matcher = TopicMatcher(topics)
+    hits = matcher.search(text)
+    for index, (topic, pattern) in enumerate(matcher.entries):
+        expected = pattern.search(text)
+        found = hits.get(index)
+        if expected is None:
+            assert found is None, pattern.pattern
+        else:
+            assert found.span() == expected.span(), pattern.pattern
+        print(topic, pattern.pattern, found.span() if found else None)
+
+    counts, title_hits, body_hits = matcher.score('All about tape', text)
+    print(counts)
+    assert counts == {'one': 4, 'two': 7}
+
+    print('Congratulations')